@@ -1,20 +1,329 @@
 import os
 import json
+import logging
 import re
 import datetime
+import time
 import asyncio
+import atexit
+import queue
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from fastapi import BackgroundTasks
-from menu_embeddings import rag_extract_menu_items
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; the standard library handles the same files
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+# menu_embeddings loads the embedding model at import, so it is imported on first use
+_rag_extract = None
+_rag_lock = threading.Lock()
+
+def rag_extract_menu_items(text: str) -> List[Dict]:
+    """Extract menu items with menu_embeddings, importing it the first time"""
+    global _rag_extract
+    if _rag_extract is None:
+        with _rag_lock:
+            if _rag_extract is None:
+                from menu_embeddings import rag_extract_menu_items as extract
+                _rag_extract = extract
+    return _rag_extract(text)
 
 # Paths for conversation and order files
 CONVERSATIONS_DIR = os.path.join(os.path.dirname(__file__), 'conversations')
 TEMP_ORDERS_DIR = os.path.join(os.path.dirname(__file__), 'temp_orders')
+ARCHIVE_DIR = os.path.join(CONVERSATIONS_DIR, 'archive')
 
 # Ensure directories exist
 os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
 os.makedirs(TEMP_ORDERS_DIR, exist_ok=True)
+os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+# Once a live conversation log exceeds this many messages, its older half moves to
+# a monthly archive file so per-turn reads stay bounded
+MAX_LIVE_MESSAGES = 200
+
+# Archive file names after the session prefix: "<YYYY-MM>.jsonl"
+_ARCHIVE_SUFFIX_RE = re.compile(r'\d{4}-\d{2}\.jsonl')
+
+# Per-session file paths are these prefixes plus the session id and extension
+_CONVERSATION_FILE_PREFIX = os.path.join(CONVERSATIONS_DIR, "conversation_")
+_ORDER_FILE_PREFIX = os.path.join(TEMP_ORDERS_DIR, "order_")
+
+def _dumps(obj) -> bytes:
+    """Serialize to compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _dumps_line(obj) -> bytes:
+    """Serialize to one newline-terminated JSONL record"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return _dumps(obj) + b"\n"
+
+def _loads(data: bytes):
+    """Parse UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Maximum number of sessions kept in each in-memory cache
+SESSION_CACHE_SIZE = 1024
+
+# Marks a cache miss where None is a legitimate cached value
+_MISSING = object()
+
+class SessionCache:
+    """Small thread-safe LRU cache of per-session data, evicting the least recently used session"""
+    
+    def __init__(self, max_size: int = SESSION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, session_id: str, default=None):
+        with self._lock:
+            if session_id not in self._entries:
+                return default
+            self._entries.move_to_end(session_id)
+            return self._entries[session_id]
+    
+    def put(self, session_id: str, value):
+        with self._lock:
+            self._entries[session_id] = value
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def pop(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+# Parsed conversations and detected orders, kept in sync with the files on write
+_CONV_CACHE = SessionCache()
+_ORDER_CACHE = SessionCache()
+
+# (byte offset, message count) of each cached conversation as last loaded from disk
+_CONV_OFFSETS = SessionCache()
+
+# Conversation length at each session's last order scan
+_LAST_SCAN = SessionCache()
+
+# (mtime_ns, size) of each file as this process last read or wrote it, keyed by path;
+# a cached entry is only trusted while the file still matches (another worker may write it)
+_FILE_STAMPS = SessionCache(2 * SESSION_CACHE_SIZE)
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Get a file's (mtime_ns, size), or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _is_cache_fresh(path: str) -> bool:
+    """Check that a file has not changed since this process last read or wrote it"""
+    return _FILE_STAMPS.get(path) == _file_stamp(path)
+
+WRITE_COALESCE_SECONDS = 0.01
+
+# How many trailing messages the order scan looks at
+RECENT_MESSAGE_WINDOW = 10
+# How many of the most recent user messages decide the order stage
+STAGE_MESSAGE_WINDOW = 3
+
+# Last formatted whole second, as (second, ISO string); timestamps mostly arrive in order
+_iso_second = (None, "")
+
+def iso(timestamp) -> str:
+    """Format a stored epoch timestamp for display; older files already hold ISO strings"""
+    global _iso_second
+    if isinstance(timestamp, str):
+        return timestamp
+    
+    # Split the same way datetime.fromtimestamp does, rounding to the nearest microsecond
+    second = int(timestamp)
+    microsecond = round((timestamp - second) * 1e6)
+    if microsecond >= 1000000:
+        second += 1
+        microsecond -= 1000000
+    
+    cached_second, prefix = _iso_second
+    if second != cached_second:
+        prefix = datetime.datetime.fromtimestamp(second).isoformat()
+        _iso_second = (second, prefix)
+    return f"{prefix}.{microsecond:06d}" if microsecond else prefix
+
+def tail_messages(path: str, n: int = RECENT_MESSAGE_WINDOW, block_size: int = 8192) -> List[Dict]:
+    """Parse the last n messages of a JSONL file by reading backwards from the end"""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        start = end
+        data = b""
+        while start > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start)
+            # More than n newlines guarantees n whole lines after the cut-off first one
+            if data.count(b"\n") > n:
+                break
+            block_size *= 2
+    
+    lines = data.split(b"\n")
+    if start > 0:
+        lines = lines[1:]
+    lines = [line for line in lines if line.strip()]
+    return [_loads(line) for line in lines[-n:]]
+
+def count_lines(path: str) -> int:
+    """Count the lines of a file without parsing them"""
+    with open(path, 'rb') as f:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 16), b""))
+
+class AsyncArtifactWriter:
+    """Writes conversation and order files from a background thread, in submission order"""
+    
+    def __init__(self):
+        self._queue = queue.Queue()
+        # Operations queued but not yet on disk, by path, so reads can see them without waiting
+        self._pending: Dict[str, List[Tuple[Optional[bytes], str]]] = {}
+        self._pending_lock = threading.Lock()
+        # Held while a batch lands, so a read sees each operation either on disk or pending
+        self._io_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+    
+    def append(self, path: str, data: bytes):
+        """Queue data to be appended to a file"""
+        self._submit(path, data, 'ab')
+    
+    def write(self, path: str, data: bytes):
+        """Queue data to replace a file's contents"""
+        self._submit(path, data, 'wb')
+    
+    def overwrite(self, path: str, data: bytes):
+        """Queue data to replace a file's contents in place, for files watched for modification
+        (a reader may briefly see the file half-written)"""
+        self._submit(path, data, 'ow')
+    
+    def remove(self, path: str):
+        """Queue a file's removal (a missing file is fine)"""
+        self._submit(path, None, 'rm')
+    
+    def _submit(self, path: str, data: Optional[bytes], mode: str):
+        with self._pending_lock:
+            self._pending.setdefault(path, []).append((data, mode))
+        self._queue.put((path, data, mode))
+    
+    def is_pending(self, path: str) -> bool:
+        """Check whether a file has queued operations that have not reached the file system"""
+        return path in self._pending
+    
+    def pending_paths(self) -> List[str]:
+        """Get the files with queued operations"""
+        with self._pending_lock:
+            return list(self._pending)
+    
+    def read(self, path: str) -> bytes:
+        """Read a file as it will be once its queued operations land, without waiting for them.
+        Raises FileNotFoundError if it will not exist"""
+        with self._io_lock:
+            with self._pending_lock:
+                ops = list(self._pending.get(path, ()))
+            # Everything before the last replace or removal is irrelevant, including the file itself
+            start = max((i for i, (_, mode) in enumerate(ops) if mode != 'ab'), default=None)
+            if start is None:
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                except FileNotFoundError:
+                    data = None
+            else:
+                data = ops[start][0]
+                ops = ops[start + 1:]
+        
+        for chunk, _ in ops:
+            data = chunk if data is None else data + chunk
+        if data is None:
+            raise FileNotFoundError(path)
+        return data
+    
+    def flush(self):
+        """Block until every queued write has reached the file system"""
+        self._queue.join()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Give a burst of messages a moment to arrive so it lands in one write
+            while True:
+                try:
+                    batch.append(self._queue.get(timeout=WRITE_COALESCE_SECONDS))
+                except queue.Empty:
+                    break
+            try:
+                with self._io_lock:
+                    self._land(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _land(self, batch):
+        """Apply a batch of queued operations to the file system and drop them from the pending set"""
+        try:
+            for path, chunks, mode in self._coalesce(batch):
+                try:
+                    if mode == 'rm':
+                        try:
+                            os.remove(path)
+                            log.debug("Cleaned up file: %s", path)
+                        except FileNotFoundError:
+                            pass
+                    elif mode == 'wb':
+                        # Replace via a temp file so readers never see a half-written file
+                        tmp_path = f"{path}.tmp"
+                        with open(tmp_path, 'wb') as f:
+                            f.write(chunks[-1])
+                        os.replace(tmp_path, path)
+                    elif mode == 'ow':
+                        with open(path, 'wb') as f:
+                            f.write(chunks[-1])
+                    else:
+                        with open(path, mode) as f:
+                            f.write(b"".join(chunks))
+                    _FILE_STAMPS.put(path, _file_stamp(path))
+                except Exception as e:
+                    log.error("Could not write %s: %s", path, e)
+        finally:
+            with self._pending_lock:
+                for path, _, _ in batch:
+                    ops = self._pending[path]
+                    del ops[0]
+                    if not ops:
+                        del self._pending[path]
+    
+    @staticmethod
+    def _coalesce(batch):
+        """Merge contiguous writes to the same file; a later replace or removal supersedes an earlier one"""
+        runs = []
+        for path, data, mode in batch:
+            if runs and runs[-1][0] == path and runs[-1][2] == mode:
+                if mode == 'ab':
+                    runs[-1][1].append(data)
+                else:
+                    runs[-1][1][:] = [data]
+            else:
+                runs.append((path, [data], mode))
+        return runs
+
+ARTIFACT_WRITER = AsyncArtifactWriter()
 
 class ConversationLogger:
     """Handles logging and managing conversation files"""
@@ -22,12 +331,22 @@ class ConversationLogger:
     @staticmethod
     def get_conversation_file(session_id: str) -> str:
         """Get the conversation file path for a session"""
-        return os.path.join(CONVERSATIONS_DIR, f"conversation_{session_id}.json")
+        return f"{_CONVERSATION_FILE_PREFIX}{session_id}.jsonl"
+    
+    @staticmethod
+    def get_legacy_conversation_file(session_id: str) -> str:
+        """Get the pre-JSONL conversation file path (a single JSON array)"""
+        return f"{_CONVERSATION_FILE_PREFIX}{session_id}.json"
+    
+    @staticmethod
+    def get_archive_file(session_id: str, month: str) -> str:
+        """Get the archive file path for a session's messages archived in a month (YYYY-MM)"""
+        return os.path.join(ARCHIVE_DIR, f"conversation_{session_id}_{month}.jsonl")
     
     @staticmethod
     def get_order_file(session_id: str) -> str:
         """Get the order file path for a session"""
-        return os.path.join(TEMP_ORDERS_DIR, f"order_{session_id}.json")
+        return f"{_ORDER_FILE_PREFIX}{session_id}.json"
     
     @staticmethod
     def log_message(session_id: str, message: str, sender: str = "user"):
@@ -35,62 +354,189 @@ class ConversationLogger:
         conversation_file = ConversationLogger.get_conversation_file(session_id)
         
         message_data = {
-            "timestamp": datetime.datetime.now().isoformat(),
+            "timestamp": time.time(),
             "sender": sender,
             "message": message
         }
         
-        # Load existing conversation or create new
-        conversation = []
-        if os.path.exists(conversation_file):
-            try:
-                with open(conversation_file, 'r', encoding='utf-8') as f:
-                    conversation = json.load(f)
-            except:
-                conversation = []
-        
-        # Add new message
-        conversation.append(message_data)
+        # Loading first migrates any legacy log before new lines are appended
+        conversation = ConversationLogger._load_conversation(session_id)
         
-        # Save back to file
-        with open(conversation_file, 'w', encoding='utf-8') as f:
-            json.dump(conversation, f, indent=2, ensure_ascii=False)
+        if conversation is not None and len(conversation) >= MAX_LIVE_MESSAGES:
+            ConversationLogger._rotate_conversation(session_id, conversation + [message_data])
+        else:
+            # Append one JSON line instead of rewriting the whole conversation
+            ARTIFACT_WRITER.append(conversation_file, _dumps_line(message_data))
+            # Cached lists are shared with readers, so the cache gets a new list rather than an append.
+            # An unreadable log stays uncached and is read again next time
+            if conversation is not None:
+                _CONV_CACHE.put(session_id, conversation + [message_data])
+        
+        log.debug("Logged message for session %s: %.50s...", session_id, message)
+    
+    @staticmethod
+    def _rotate_conversation(session_id: str, conversation: List[Dict]):
+        """Move the older half of a live conversation to this month's archive file"""
+        split = len(conversation) // 2
+        live = conversation[split:]
+        live_data = b"".join(_dumps_line(message_data) for message_data in live)
+        
+        ARTIFACT_WRITER.append(
+            ConversationLogger.get_archive_file(session_id, datetime.datetime.now().strftime("%Y-%m")),
+            b"".join(_dumps_line(message_data) for message_data in conversation[:split])
+        )
+        ARTIFACT_WRITER.write(ConversationLogger.get_conversation_file(session_id), live_data)
         
-        print(f"DEBUG: Logged message for session {session_id}: {message[:50]}...")
+        # The cache now matches the file as it will be once the writes land
+        _CONV_CACHE.put(session_id, live)
+        _CONV_OFFSETS.put(session_id, (len(live_data), len(live)))
+        log.debug("Archived %d messages for session %s", split, session_id)
+    
+    @staticmethod
+    def get_archive_files(session_id: str) -> List[str]:
+        """Get a session's archive files, oldest first"""
+        prefix = f"conversation_{session_id}_"
+        try:
+            files = set(os.listdir(ARCHIVE_DIR))
+        except FileNotFoundError:
+            files = set()
+        # Include archives whose first write is still queued
+        files.update(
+            os.path.basename(path) for path in ARTIFACT_WRITER.pending_paths()
+            if os.path.dirname(path) == ARCHIVE_DIR
+        )
+        return sorted(
+            os.path.join(ARCHIVE_DIR, file) for file in files
+            if file.startswith(prefix) and _ARCHIVE_SUFFIX_RE.fullmatch(file, len(prefix))
+        )
+    
+    @staticmethod
+    def get_full_conversation(session_id: str) -> List[Dict]:
+        """Get a conversation including archived messages (a new list)"""
+        conversation = []
+        for archive_file in ConversationLogger.get_archive_files(session_id):
+            try:
+                data = ARTIFACT_WRITER.read(archive_file)
+                conversation.extend(_loads(line) for line in data.splitlines() if line)
+            except FileNotFoundError:  # Removal queued
+                pass
+            except Exception as e:
+                log.error("Could not read %s: %s", archive_file, e)
+        conversation.extend(ConversationLogger.get_conversation(session_id))
+        return conversation
     
     @staticmethod
     def get_conversation(session_id: str) -> List[Dict]:
-        """Get the entire conversation for a session"""
+        """Get the live (recent) conversation for a session.
+        The list is shared with the cache and never modified in place; callers must not modify it either"""
+        conversation = ConversationLogger._load_conversation(session_id)
+        return [] if conversation is None else conversation
+    
+    @staticmethod
+    def _load_conversation(session_id: str) -> Optional[List[Dict]]:
+        """Get the cached live conversation, reading it on a miss; None if it could not be read"""
+        conversation = _CONV_CACHE.get(session_id)
+        if conversation is None or not _is_cache_fresh(ConversationLogger.get_conversation_file(session_id)):
+            try:
+                conversation = ConversationLogger._read_conversation(session_id)
+            except (OSError, ValueError) as e:
+                # Not cached, so a transient failure does not hide the history
+                log.error("Could not read conversation for session %s: %s", session_id, e)
+                return None
+            _CONV_CACHE.put(session_id, conversation)
+        return conversation
+    
+    @staticmethod
+    def get_recent_messages(session_id: str, n: int = RECENT_MESSAGE_WINDOW) -> Tuple[List[Dict], int]:
+        """Get the last n messages of a conversation and its total length, without loading it all"""
+        conversation_file = ConversationLogger.get_conversation_file(session_id)
+        conversation = _CONV_CACHE.get(session_id)
+        if conversation is None or not _is_cache_fresh(conversation_file):
+            if not ARTIFACT_WRITER.is_pending(conversation_file):
+                try:
+                    return tail_messages(conversation_file, n), count_lines(conversation_file)
+                except FileNotFoundError:
+                    pass  # Possibly a legacy log, which has to be loaded (and migrated) in full
+                except (OSError, ValueError) as e:
+                    log.error("Could not read conversation for session %s: %s", session_id, e)
+                    return [], 0
+            # With writes still queued the file alone is behind, so load the conversation whole
+            conversation = ConversationLogger.get_conversation(session_id)
+        return conversation[-n:], len(conversation)
+    
+    @staticmethod
+    def _read_conversation(session_id: str) -> List[Dict]:
+        """Load a conversation from disk, parsing only lines added since the last load if it is cached.
+        Raises OSError or ValueError if the file cannot be read or parsed"""
         conversation_file = ConversationLogger.get_conversation_file(session_id)
         
-        if os.path.exists(conversation_file):
-            try:
-                with open(conversation_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+        # The first `count` cached messages are exactly the file's first `offset` bytes
+        cached = _CONV_CACHE.get(session_id)
+        offset, count = _CONV_OFFSETS.get(session_id, (0, 0)) if cached is not None else (0, 0)
+        
+        try:
+            if ARTIFACT_WRITER.is_pending(conversation_file):
+                # Its latest writes are still queued; read it whole as it will be once they land
+                offset, count = 0, 0
+                data = ARTIFACT_WRITER.read(conversation_file)
+            else:
+                with open(conversation_file, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size < offset:  # Replaced since the last load
+                        offset, count = 0, 0
+                    f.seek(offset)
+                    data = f.read()
+                _FILE_STAMPS.put(conversation_file, _file_stamp(conversation_file))
+            
+            # Leave a partially written last line for the next load
+            consumed = data.rfind(b"\n") + 1
+            conversation = cached[:count] if count else []
+            conversation.extend(_loads(line) for line in data[:consumed].splitlines() if line)
+            _CONV_OFFSETS.put(session_id, (offset + consumed, len(conversation)))
+            return conversation
+        except FileNotFoundError:
+            _FILE_STAMPS.pop(conversation_file)
+            _CONV_OFFSETS.pop(session_id)
+            return ConversationLogger._migrate_legacy_conversation(session_id)
+    
+    @staticmethod
+    def _migrate_legacy_conversation(session_id: str) -> List[Dict]:
+        """Convert a legacy JSON array conversation file to JSONL, if one exists"""
+        legacy_file = ConversationLogger.get_legacy_conversation_file(session_id)
+        
+        try:
+            conversation = _loads(ARTIFACT_WRITER.read(legacy_file))
+        except FileNotFoundError:
+            return []
+        
+        data = b"".join(_dumps_line(message_data) for message_data in conversation)
+        ARTIFACT_WRITER.write(ConversationLogger.get_conversation_file(session_id), data)
+        ARTIFACT_WRITER.remove(legacy_file)
+        _CONV_OFFSETS.put(session_id, (len(data), len(conversation)))
+        return conversation
     
     @staticmethod
     def cleanup_session(session_id: str):
         """Clean up conversation and order files for a session"""
         conversation_file = ConversationLogger.get_conversation_file(session_id)
+        legacy_file = ConversationLogger.get_legacy_conversation_file(session_id)
         order_file = ConversationLogger.get_order_file(session_id)
         
-        for file_path in [conversation_file, order_file]:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    print(f"DEBUG: Cleaned up file: {file_path}")
-                except Exception as e:
-                    print(f"ERROR: Could not remove {file_path}: {e}")
+        _CONV_CACHE.pop(session_id)
+        _CONV_OFFSETS.pop(session_id)
+        _ORDER_CACHE.pop(session_id)
+        _LAST_SCAN.pop(session_id)
+        
+        # Removals queue behind any pending writes, so those cannot recreate the files afterwards
+        archive_files = ConversationLogger.get_archive_files(session_id)
+        for file_path in [conversation_file, legacy_file, order_file, *archive_files]:
+            ARTIFACT_WRITER.remove(file_path)
 
 class OrderKeywordDetector:
     """Background task for detecting order keywords in conversations"""
     
-    # Keywords that indicate order intent
+    # Keywords that indicate order intent (most common first)
     ORDER_KEYWORDS = [
-        r'\border\b', r'\bbuy\b', r'\bget\b', r'\bwant\b', r'\bpurchase\b',
+        r'\bwant\b', r'\border\b', r'\bget\b', r'\bbuy\b', r'\bpurchase\b',
         r'\bi\'?ll have\b', r'\bcan i get\b', r'\bcan i have\b',
         r'\badd.*cart\b', r'\bcheckout\b', r'\bplace.*order\b'
     ]
@@ -100,159 +546,283 @@ class OrderKeywordDetector:
         r'\byes\b', r'\bconfirm\b', r'\bokay\b', r'\bsure\b', r'\bgood\b'
     ]
     
+    # Plain substrings implied by the order keywords; a cheap `in` check on these
+    # rules a text out before any regex has to run
+    ORDER_LITERALS = frozenset({"want", "order", "get", "buy", "purchas", "have", "cart", "checkout"})
+    
+    # Single-word order keywords, matched as whole tokens; only texts that could
+    # hold one of the multi-word phrases still need the regex
+    ORDER_WORDS = frozenset({"want", "order", "get", "buy", "purchase", "checkout"})
+    ORDER_PHRASE_LITERALS = ("have", "cart", "place")
+    WORD_RE = re.compile(r'\w+')
+    
+    # Each keyword list compiled once into a single alternation so a scan is one search.
+    # Patterns are all lowercase and searched on lowercased text, so no IGNORECASE is needed
+    ORDER_KEYWORDS_RE = re.compile("|".join(ORDER_KEYWORDS))
+    CONFIRMATION_RE = re.compile("|".join(CONFIRMATION_KEYWORDS))
+    
+    # Digit runs (spaces/hyphens allowed between digits), building codes and confirmation
+    # keywords, found in one pass
+    STAGE_RE = re.compile(
+        r'(?P<digits>\d(?:[ \-]*\d)*)|(?P<building>\ba\d[abc]\b)|(?P<confirm>' + "|".join(CONFIRMATION_KEYWORDS) + ')'
+    )
+    # Translation tables for the separators allowed inside a digit run
+    HYPHEN_TO_SPACE = str.maketrans('-', ' ')
+    STRIP_SEPARATORS = str.maketrans('', '', ' -')
+    
     # Keywords for personal information
     INFO_KEYWORDS = [
         r'\brfid.*id\b', r'\bid.*\d{8}\b', r'\bbuilding\b', r'\bphone\b',
-        r'\bA\d[ABC]\b', r'\bspecial.*request\b'
+        r'\ba\d[abc]\b', r'\bspecial.*request\b'
     ]
     
     @staticmethod
-    def scan_for_order_intent(conversation: List[Dict]) -> Optional[Dict]:
-        """Scan conversation for order-related patterns"""
-        
-        # Get recent messages (last 10)
-        recent_messages = conversation[-10:] if len(conversation) > 10 else conversation
-        user_messages = [msg for msg in recent_messages if msg['sender'] == 'user']
-        
-        if not user_messages:
+    def scan_for_order_intent(conversation: List[Dict], conversation_length: Optional[int] = None) -> Optional[Dict]:
+        """Scan conversation for order-related patterns (conversation may be just its recent tail)"""
+        
+        # Walk the recent messages (last 10) back from the end in place, without slicing
+        user_texts = []
+        end = len(conversation)
+        for i in range(end - 1, max(end - RECENT_MESSAGE_WINDOW, 0) - 1, -1):
+            msg = conversation[i]
+            if msg['sender'] == 'user':
+                user_texts.append(msg['message'])
+        user_texts.reverse()
+        
+        if not user_texts:
             return None
         
         # Combine recent user messages for analysis
-        combined_text = " ".join([msg['message'] for msg in user_messages])
+        combined_text = " ".join(user_texts)
         
-        print(f"DEBUG: Scanning combined text: {combined_text[:100]}...")
+        log.debug("Scanning combined text: %.100s...", combined_text)
         
-        # Check for order keywords
-        has_order_intent = any(
-            re.search(keyword, combined_text, re.IGNORECASE) 
-            for keyword in OrderKeywordDetector.ORDER_KEYWORDS
-        )
+        # Check for order keywords, skipping the regex when no literal can match
+        lowered_text = combined_text.lower()
+        if not any(literal in lowered_text for literal in OrderKeywordDetector.ORDER_LITERALS):
+            return None
+        
+        has_order_intent = OrderKeywordDetector._has_order_intent(lowered_text)
         
         if not has_order_intent:
             return None
         
         # Extract items from the conversation
-        extracted_items = rag_extract_menu_items(combined_text)
+        extracted_items = OrderKeywordDetector._extract_items(user_texts)
         
         if not extracted_items:
-            print("DEBUG: Order intent detected but no items found")
+            log.debug("Order intent detected but no items found")
             return None
         
         # Analyze conversation stage
-        stage = OrderKeywordDetector._determine_order_stage(user_messages)
+        stage = OrderKeywordDetector._determine_order_stage(" ".join(user_texts[-STAGE_MESSAGE_WINDOW:]))
         
         order_data = {
             "items": extracted_items,
             "stage": stage,
             "total_cost": sum(item.get('total_price', 0) for item in extracted_items),
-            "detected_at": datetime.datetime.now().isoformat(),
-            "conversation_length": len(conversation)
+            "detected_at": time.time(),
+            "conversation_length": len(conversation) if conversation_length is None else conversation_length
         }
         
-        print(f"DEBUG: Order detected - Items: {len(extracted_items)}, Stage: {stage}")
+        log.debug("Order detected - Items: %d, Stage: %s", len(extracted_items), stage)
         return order_data
     
     @staticmethod
-    def _determine_order_stage(user_messages: List[Dict]) -> str:
-        """Determine what stage of the order process we're in"""
-        
-        # Look at the last few messages to determine stage
-        recent_text = " ".join([msg['message'] for msg in user_messages[-3:]])
-        
-        # Check for RFID ID patterns
-        if re.search(r'\d{6}', recent_text):
-            return "rf_id_provided"
-        
-        # Check for building patterns
-        if re.search(r'\bA\d[ABC]\b', recent_text, re.IGNORECASE):
+    def _extract_items(user_texts: List[str]) -> List[Dict]:
+        """Extract menu items message by message, a later mention of an item replacing an earlier one.
+        
+        Unlike extracting from the joined window, an item restated with a new quantity
+        ("2 margherita" then "make it 3 margherita") is counted once at the new quantity,
+        and a quantity cannot pair with an item named in a different message"""
+        # rag_extract_menu_items is memoized per text, so only the newest message is embedded each turn
+        items = {}
+        for text in user_texts:
+            for item in rag_extract_menu_items(text):
+                key = item.get('name') or ('category', item.get('category'))
+                items.pop(key, None)
+                items[key] = item
+        return list(items.values())
+    
+    @staticmethod
+    def _has_order_intent(lowered_text: str) -> bool:
+        """Check lowercased text for any of the ORDER_KEYWORDS"""
+        # One linear tokenizing pass covers the single-word keywords
+        if not OrderKeywordDetector.ORDER_WORDS.isdisjoint(OrderKeywordDetector.WORD_RE.findall(lowered_text)):
+            return True
+        if any(literal in lowered_text for literal in OrderKeywordDetector.ORDER_PHRASE_LITERALS):
+            return bool(OrderKeywordDetector.ORDER_KEYWORDS_RE.search(lowered_text))
+        return False
+    
+    @staticmethod
+    def _determine_order_stage(recent_text: str) -> str:
+        """Determine what stage of the order process we're in from the last few user messages"""
+        
+        # Single scan for RFID, building, phone and confirmation patterns, checked in that priority
+        has_building = False
+        has_phone = False
+        has_confirmation = False
+        for match in OrderKeywordDetector.STAGE_RE.finditer(recent_text.lower()):
+            if match.lastgroup == 'building':
+                has_building = True
+                continue
+            if match.lastgroup == 'confirm':
+                has_confirmation = True
+                continue
+            
+            digit_run = match.group()
+            # RFID: 6+ digits with no separator in between
+            if any(len(part) >= 6 for part in digit_run.translate(OrderKeywordDetector.HYPHEN_TO_SPACE).split()):
+                return "rf_id_provided"
+            # Phone: 9+ digits once separators are ignored
+            if len(digit_run.translate(OrderKeywordDetector.STRIP_SEPARATORS)) >= 9:
+                has_phone = True
+        
+        if has_building:
             return "building_provided"
         
-        # Check for phone patterns
-        if re.search(r'\d{9,15}', recent_text.replace(' ', '').replace('-', '')):
+        if has_phone:
             return "phone_provided"
         
-        # Check for confirmation
-        if any(re.search(keyword, recent_text, re.IGNORECASE) 
-               for keyword in OrderKeywordDetector.CONFIRMATION_KEYWORDS):
+        if has_confirmation:
             return "confirming_order"
         
         return "order_intent"
     
     @staticmethod
-    def save_detected_order(session_id: str, order_data: Dict):
-        """Save detected order data to temporary file"""
+    def save_detected_order(session_id: str, order_data: Optional[Dict]):
+        """Save detected order data to temporary file, unless only when and at which
+        conversation length it was detected changed. None clears the detected order"""
         order_file = ConversationLogger.get_order_file(session_id)
         
-        with open(order_file, 'w', encoding='utf-8') as f:
-            json.dump(order_data, f, indent=2, ensure_ascii=False)
+        previous = _ORDER_CACHE.get(session_id)
+        _ORDER_CACHE.put(session_id, order_data)
+        if (isinstance(previous, dict) and isinstance(order_data, dict)
+                and dict(previous, detected_at=None, conversation_length=None)
+                == dict(order_data, detected_at=None, conversation_length=None)):
+            return
+        ARTIFACT_WRITER.write(order_file, _dumps(order_data))
         
-        print(f"DEBUG: Saved order data for session {session_id}")
+        log.debug("Saved order data for session %s", session_id)
     
     @staticmethod
     def get_detected_order(session_id: str) -> Optional[Dict]:
         """Get detected order data if it exists"""
-        order_file = ConversationLogger.get_order_file(session_id)
-        
-        if os.path.exists(order_file):
+        order_data = _ORDER_CACHE.get(session_id, _MISSING)
+        if order_data is _MISSING or not _is_cache_fresh(ConversationLogger.get_order_file(session_id)):
             try:
-                with open(order_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
+                order_data = OrderKeywordDetector._read_detected_order(session_id)
+            except (OSError, ValueError) as e:
+                # Not cached, so the next call reads the file again
+                log.error("Could not read detected order for session %s: %s", session_id, e)
                 return None
-        return None
+            _ORDER_CACHE.put(session_id, order_data)
+        return order_data
+    
+    @staticmethod
+    def _read_detected_order(session_id: str) -> Optional[Dict]:
+        """Load detected order data as it will be once queued writes land (None if there is none)"""
+        order_file = ConversationLogger.get_order_file(session_id)
+        pending = ARTIFACT_WRITER.is_pending(order_file)
+        
+        try:
+            data = ARTIFACT_WRITER.read(order_file)
+        except FileNotFoundError:
+            _FILE_STAMPS.pop(order_file)
+            return None
+        if not pending:
+            _FILE_STAMPS.put(order_file, _file_stamp(order_file))
+        return _loads(data)
+
+# Serializes order processing per session: [lock, runs holding or waiting for it],
+# dropped once the last run finishes
+_SESSION_LOCKS: Dict[str, list] = {}
 
 class BackgroundOrderProcessor:
     """Background task processor for order detection"""
     
+    # Order stages from earliest to latest
+    STAGE_PROGRESSION = {
+        'order_intent': 0,
+        'confirming_order': 1,
+        'rf_id_provided': 2,
+        'building_provided': 3,
+        'phone_provided': 4
+    }
+    
     @staticmethod
     async def process_session_orders(session_id: str):
         """Background task to process orders for a session"""
+        # One run per session at a time, so concurrent runs cannot interleave their order updates
+        entry = _SESSION_LOCKS.get(session_id)
+        if entry is None:
+            entry = _SESSION_LOCKS[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await BackgroundOrderProcessor._process_session_orders(session_id)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del _SESSION_LOCKS[session_id]
+    
+    @staticmethod
+    async def _process_session_orders(session_id: str):
+        # Only the tail of the conversation is scanned; a cache miss reads it from disk,
+        # so keep it off the event loop
+        recent_messages, conversation_length = await asyncio.to_thread(
+            ConversationLogger.get_recent_messages, session_id
+        )
         
-        # Get the conversation
-        conversation = ConversationLogger.get_conversation(session_id)
-        
-        if len(conversation) < 2:  # Need at least some conversation
+        if conversation_length < 2:  # Need at least some conversation
             return
         
-        # Scan for order intent
-        order_data = OrderKeywordDetector.scan_for_order_intent(conversation)
+        # Only user messages can change the result, so skip if none arrived since the last scan
+        # (messages older than the scanned tail cannot affect it either)
+        last_scanned = _LAST_SCAN.get(session_id, 0)
+        if last_scanned <= conversation_length:
+            new_count = min(conversation_length - last_scanned, len(recent_messages))
+            new_messages = recent_messages[len(recent_messages) - new_count:]
+            if not any(msg['sender'] == 'user' for msg in new_messages):
+                return
+        
+        # Scan for order intent; the RAG lookup is CPU-bound (torch releases the GIL), so run it in a thread
+        order_data = await asyncio.to_thread(
+            OrderKeywordDetector.scan_for_order_intent, recent_messages, conversation_length
+        )
         
         if order_data:
             # Check if we already have an order for this session
-            existing_order = OrderKeywordDetector.get_detected_order(session_id)
+            existing_order = await asyncio.to_thread(OrderKeywordDetector.get_detected_order, session_id)
             
             # Only update if this is new or significantly different
             if not existing_order or BackgroundOrderProcessor._is_order_updated(existing_order, order_data):
                 OrderKeywordDetector.save_detected_order(session_id, order_data)
-                print(f"DEBUG: Updated order for session {session_id}")
+                log.debug("Updated order for session %s", session_id)
+        
+        # Recorded only once the scan went through, so a failed scan is retried on the next run
+        _LAST_SCAN.put(session_id, conversation_length)
     
     @staticmethod
     def _is_order_updated(old_order: Dict, new_order: Dict) -> bool:
         """Check if the order has been meaningfully updated"""
         
-        # Check if items changed
-        old_items = old_order.get('items', [])
-        new_items = new_order.get('items', [])
-        
-        if len(old_items) != len(new_items):
-            return True
-        
         # Check if stage progressed
-        old_stage = old_order.get('stage', '')
-        new_stage = new_order.get('stage', '')
-        
-        stage_progression = {
-            'order_intent': 0,
-            'confirming_order': 1,
-            'rf_id_provided': 2,
-            'building_provided': 3,
-            'phone_provided': 4
-        }
-        
-        old_stage_level = stage_progression.get(old_stage, 0)
-        new_stage_level = stage_progression.get(new_stage, 0)
+        stage_progression = BackgroundOrderProcessor.STAGE_PROGRESSION
+        if stage_progression.get(new_order.get('stage'), 0) > stage_progression.get(old_order.get('stage'), 0):
+            return True
         
-        return new_stage_level > old_stage_level
+        # Check if items changed
+        return len(old_order.get('items') or ()) != len(new_order.get('items') or ())
+
+# Instruction appended to the AI prompt for each order stage
+STAGE_PROMPTS = {
+    "order_intent": "\nAsk user if they want to confirm this order.",
+    "confirming_order": "\nUser seems to be confirming. Ask for RFID Number (your 6 digit number after the + on bottom right of card).",
+    "rf_id_provided": "\nRFID ID provided. Ask for building (A1A, A1B, A1C, etc.).",
+    "building_provided": "\nBuilding provided. Ask for phone number.",
+    "phone_provided": "\nPhone provided. Ask for special requests, then complete order.",
+}
 
 def get_order_context_for_ai(session_id: str) -> str:
     """Get order context to add to AI prompt"""
@@ -283,20 +853,8 @@ def get_order_context_for_ai(session_id: str) -> str:
     items_text = ", ".join(items_summary)
     
     # Create context based on stage
-    context = f"\n[DETECTED ORDER] Background system detected order intent: {items_text} (Total: AED {total_cost:.2f})"
-    
-    if stage == "order_intent":
-        context += "\nAsk user if they want to confirm this order."
-    elif stage == "confirming_order":
-        context += "\nUser seems to be confirming. Ask for RFID Number (your 6 digit number after the + on bottom right of card)."
-    elif stage == "rf_id_provided":
-        context += "\RFID ID provided. Ask for building (A1A, A1B, A1C, etc.)."
-    elif stage == "building_provided":
-        context += "\nBuilding provided. Ask for phone number."
-    elif stage == "phone_provided":
-        context += "\nPhone provided. Ask for special requests, then complete order."
-    
-    return context
+    header = f"\n[DETECTED ORDER] Background system detected order intent: {items_text} (Total: AED {total_cost:.2f})"
+    return header + STAGE_PROMPTS.get(stage, "")
 
 # Utility functions for the main FastAPI app
 def add_background_order_processing(session_id: str, background_tasks: BackgroundTasks):
@@ -327,8 +885,8 @@ def test_order_detection():
     
     # Save test conversation
     conversation_file = ConversationLogger.get_conversation_file(test_session)
-    with open(conversation_file, 'w', encoding='utf-8') as f:
-        json.dump(test_conversation, f)
+    with open(conversation_file, 'wb') as f:
+        f.write(b"".join(_dumps_line(message) for message in test_conversation))
     
     # Test order detection
     detected_order = OrderKeywordDetector.scan_for_order_intent(test_conversation)
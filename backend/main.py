@@ -2,22 +2,33 @@ import os
 from fastapi import FastAPI, HTTPException, Request, Response, BackgroundTasks
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, ORJSONResponse
 import httpx
+import asyncio
 import json
 import re
 import datetime
+import time
 import phonenumbers
+import logging
+import logging.handlers
+import queue
+import atexit
 from typing import Dict, Optional, List, Union
 
+try:
+    import orjson
+except ImportError:  # Optional speedup for parsing the Ollama stream
+    orjson = None
+
 MENU_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'menu.json'))
 
 # Import our background order system
 from background_order_system import (
-    ConversationLogger, OrderKeywordDetector, BackgroundOrderProcessor
+    ConversationLogger, OrderKeywordDetector, BackgroundOrderProcessor, ARTIFACT_WRITER, iso
 )
-from menu_embeddings import rag_extract_menu_items, rag_extract_menu_item, format_items_summary
-from menu_embeddings import is_category_name
+from menu_embeddings import rag_extract_menu_items, format_items_summary
+from menu_embeddings import flatten_menu
 
 # Define the path to the system prompt file
 SYSTEM_PROMPT_PATH = os.path.join(os.path.dirname(__file__), 'system_prompt.txt')
@@ -26,6 +37,18 @@ SYSTEM_PROMPT_PATH = os.path.join(os.path.dirname(__file__), 'system_prompt.txt'
 OLLAMA_URL = 'http://localhost:11434/api/generate'
 OLLAMA_MODEL = 'qwen2.5'
 
+# The read timeout applies between streamed chunks, so long generations are fine as long
+# as tokens keep arriving; a whole chat reply, follow-up included, is capped at OLLAMA_TOTAL_TIMEOUT seconds.
+# A request that fails before any text reached the client is tried OLLAMA_ATTEMPTS times
+OLLAMA_TIMEOUT = httpx.Timeout(connect=2.0, read=30.0, write=10.0, pool=5.0)
+OLLAMA_TOTAL_TIMEOUT = 120
+OLLAMA_ATTEMPTS = 2
+
+# Streamed tokens are sent to the client in chunks of at least this many characters,
+# or whatever has arrived once this many seconds have passed (1 char = per token)
+STREAM_BATCH_CHARS = int(os.environ.get('STREAM_BATCH_CHARS', '32'))
+STREAM_BATCH_INTERVAL = float(os.environ.get('STREAM_BATCH_INTERVAL', '0.025'))
+
 # MCP server endpoints
 MCP_ITEM_URL = 'http://localhost:9000/menu/item'
 MCP_MENU_URL = 'http://localhost:9000/menu/today'
@@ -33,13 +56,307 @@ MCP_CATEGORY_URL = 'http://localhost:9000/menu/category'
 
 RESTAURANTS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'restaurants.json'))
 
+# Parses JSON straight from bytes, without decoding it to str first
+_loads_json = orjson.loads if orjson is not None else json.loads
+
+# Request bodies are serialized to bytes up front and sent with content=
+JSON_HEADERS = {"content-type": "application/json"}
+
+def _dumps_json(obj) -> bytes:
+    """Serialize to compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+# Parsed data files with the (mtime_ns, size) they were parsed at and when that was last
+# confirmed, keyed by path. A file is stat'ed at most once per FILE_CHECK_INTERVAL seconds,
+# so an edit is picked up within that long
+FILE_CHECK_INTERVAL = 1.0
+_file_cache: Dict[str, tuple] = {}
+
+def _file_stamp(path: str) -> tuple:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _read_json(path: str):
+    with open(path, 'rb') as f:
+        return _loads_json(f.read())
+
+def _read_text(path: str) -> str:
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+def _fresh_cache_entry(path: str) -> Optional[tuple]:
+    """Get the cache entry for a file if it still matches the file on disk"""
+    cached = _file_cache.get(path)
+    if cached is None:
+        return None
+    stamp, data, checked_at = cached
+    now = time.monotonic()
+    if now - checked_at < FILE_CHECK_INTERVAL:
+        return cached
+    if _file_stamp(path) != stamp:
+        return None
+    cached = _file_cache[path] = (stamp, data, now)
+    return cached
+
+def load_file_cached(path: str, read=_read_json):
+    """Load a data file with read(path), rereading it only when it changes on disk (shared data; do not mutate)"""
+    cached = _fresh_cache_entry(path)
+    if cached is not None:
+        return cached[1]
+    stamp = _file_stamp(path)
+    data = read(path)
+    _file_cache[path] = (stamp, data, time.monotonic())
+    return data
+
+def load_json_cached(path: str):
+    """Load a JSON file, reparsing it only when it changes on disk (shared data; do not mutate)"""
+    return load_file_cached(path, _read_json)
+
+async def load_file_cached_async(path: str, read=_read_json):
+    """Like load_file_cached, but a reread happens in a worker thread instead of on the event loop"""
+    cached = _fresh_cache_entry(path)
+    if cached is not None:
+        return cached[1]
+    return await asyncio.to_thread(load_file_cached, path, read)
+
 # Final order storage path
 ORDERS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), 'orders.txt'))
 
 # Available buildings
-AVAILABLE_BUILDINGS = ["A1A", "A1B", "A1C", "A2A", "A2B", "A2C", "A3", "A4", "A5A", "A5B", "A5C", "A6A", "A6B", "A6C", "A1", "A2", "A5", "A6", "F1", "F2", "C1", "C2", "C3"]
+AVAILABLE_BUILDINGS = ("A1A", "A1B", "A1C", "A2A", "A2B", "A2C", "A3", "A4", "A5A", "A5B", "A5C", "A6A", "A6B", "A6C", "A1", "A2", "A5", "A6", "F1", "F2", "C1", "C2", "C3")
+AVAILABLE_BUILDINGS_SET = frozenset(AVAILABLE_BUILDINGS)
+AVAILABLE_BUILDINGS_JOINED = ', '.join(AVAILABLE_BUILDINGS)
+AVAILABLE_BUILDINGS_SORTED_JOINED = ', '.join(sorted(AVAILABLE_BUILDINGS))
+
+# "Still Missing" lines of the in-flow order status prompt, built once
+MISSING_RF_ID_TEXT = "- RF ID (must be 6 digits)\n"
+MISSING_BUILDING_TEXT = f"- Building (must be one of: {AVAILABLE_BUILDINGS_JOINED})\n"
+MISSING_PHONE_TEXT = "- Phone number (must be a valid UAE mobile number)\n"
+MISSING_SPECIAL_REQUEST_TEXT = "- Special Request (ask if they have any special requests, dietary restrictions, etc.)\n"
+
+# Debug output is off unless LOG_LEVEL=DEBUG, so the chat path does no console I/O for it.
+# Records are handed to a queue and written to the console by a listener thread, so
+# logging never blocks the event loop on a slow terminal or redirected file
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('[%(levelname)s %(asctime)s] %(name)s: %(message)s', datefmt='%H:%M:%S'))
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_queue_handler = logging.handlers.QueueHandler(_log_queue)
+# The queued record carries just the message; the console handler adds the prefix
+_log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    handlers=[_log_queue_handler]
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+log = logging.getLogger(__name__)
+
+class RateLimitFilter(logging.Filter):
+    """Drop a message logged again within `interval` seconds of the last time it got through"""
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._last_emitted = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        last = self._last_emitted.get(record.msg)
+        if last is not None and now - last < self.interval:
+            return False
+        self._last_emitted[record.msg] = now
+        return True
+
+# Per-line stream problems, at most one report per kind every 5s when a stream goes bad
+stream_log = logging.getLogger(f"{__name__}.stream")
+stream_log.addFilter(RateLimitFilter(5.0))
+
+# Phrases asking for the full menu or for open restaurants, shared by the intent patterns below
+MENU_REQUEST_PHRASES = r"what'?s on the menu|show me the menu|today'?s menu|full menu"
+OPEN_REQUEST_PHRASES = r"what'?s open|which restaurants are open|open restaurants"
+
+# Chat intents as named groups of one pattern, so a single scan of the message finds them all
+INTENTS_RE = re.compile(
+    rf"(?P<menu>{MENU_REQUEST_PHRASES}|what'?s available)"
+    r"|(?P<order>order|buy|get|want|purchase|can i get|i'?ll have)"
+    rf"|(?P<open>{OPEN_REQUEST_PHRASES}|open now)",
+    re.IGNORECASE
+)
+ORDER_INFO_RE = re.compile(r'\b(rf|id|building|phone|number)\b')
+# Messages that may carry order details, checked before the LLM sees them
+ORDER_DETAILS_RE = re.compile(r'\b(rf|rfid|building|phone|05\d{8}|\d{4,15}|[A-Z]\d[A-Z]?)\b', re.IGNORECASE)
+# Replies to the order confirmation question (matched against the lowercased message)
+CONFIRM_REPLY_RE = re.compile(r'\b(yes|yeah|yep|confirm|ok|okay|sure|correct|right|proceed)\b')
+DECLINE_REPLY_RE = re.compile(r'\b(no|nah|nope|cancel|wrong|incorrect)\b')
+# Replies meaning "no special request" while the order flow asks for one
+NO_SPECIAL_REQUEST_REPLIES = frozenset({
+    'no', 'none', 'n/a', 'no special requests', 'nothing',
+    "don't have any special requests", "i don't have any special requests"
+})
+# Status lines the frontend shows apart from the reply, pre-encoded for the response stream
+FETCHING_MENU_STATUS = b"[Fetching menu data...]\n"
+CHECKING_OPEN_STATUS = b"[Checking which restaurants are open... Please wait.]\n"
+
+# Messages that are nothing but a menu or open-restaurants request, answered without the LLM
+DIRECT_INTENT_RE = re.compile(
+    r"\s*(?:(?:hi|hey|hello|please|can you|could you)[\s,]+)*"
+    rf"(?:(?P<menu>{MENU_REQUEST_PHRASES})|(?P<open>{OPEN_REQUEST_PHRASES}))"
+    r"(?:\s+(?:now|right now|today))?(?:[\s,]+please)?\s*[?.!]*\s*",
+    re.IGNORECASE
+)
 
-app = FastAPI()
+# JSON endpoints serialize with orjson when it is installed
+app = FastAPI(default_response_class=ORJSONResponse if orjson is not None else JSONResponse)
+
+# Shared HTTP clients, so requests reuse pooled connections instead of handshaking per call.
+# Ollama gets its own client so long generation streams never hold up MCP lookups
+MCP_CLIENT: Optional[httpx.AsyncClient] = None
+OLLAMA_CLIENT: Optional[httpx.AsyncClient] = None
+
+def get_mcp_client() -> httpx.AsyncClient:
+    """Get the shared MCP client, creating it on first use"""
+    global MCP_CLIENT
+    if MCP_CLIENT is None:
+        MCP_CLIENT = httpx.AsyncClient(timeout=2.0, limits=httpx.Limits(max_connections=64, max_keepalive_connections=32))
+    return MCP_CLIENT
+
+def get_ollama_client() -> httpx.AsyncClient:
+    """Get the shared Ollama client, creating it on first use"""
+    global OLLAMA_CLIENT
+    if OLLAMA_CLIENT is None:
+        OLLAMA_CLIENT = httpx.AsyncClient(
+            timeout=OLLAMA_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=32),
+        )
+    return OLLAMA_CLIENT
+
+async def aiter_ndjson_lines(response: httpx.Response):
+    """Yield the non-blank lines of a newline-delimited JSON response body as bytes"""
+    # Network chunks are yielded as they arrive (no chunk_size, which would hold tokens
+    # back until a full chunk is buffered); consumed lines are cut from the front in place
+    buf = bytearray()
+    async for chunk in response.aiter_bytes():
+        buf.extend(chunk)
+        while (nl := buf.find(b"\n")) != -1:
+            line = bytes(buf[:nl])
+            del buf[:nl + 1]
+            if line.strip():
+                yield line
+    if buf.strip():
+        yield bytes(buf)
+
+async def iter_ollama_stream(client: httpx.AsyncClient, payload: dict):
+    """Stream an Ollama generate request, yielding each parsed response line"""
+    async with client.stream("POST", OLLAMA_URL, content=_dumps_json(payload), headers=JSON_HEADERS) as response:
+        async for line in aiter_ndjson_lines(response):
+            # Every line Ollama streams is a JSON object
+            if line[:1] != b"{":
+                stream_log.warning("Skipping non-JSON stream line: %.80r", line)
+                continue
+            try:
+                data = _loads_json(line)
+            except Exception as e:
+                stream_log.warning("Streaming parse error: %s", e)
+                continue
+            yield data
+
+# Marks the end of an iterable handed over by aiter_with_idle
+_STREAM_END = object()
+
+async def aiter_with_idle(aiterable, idle_timeout):
+    """
+    Yield the items of an async iterable, and None whenever idle_timeout() seconds pass without
+    one (idle_timeout may return None to wait without a limit). The iterable is consumed in a
+    task of its own, so giving up on a wait never cancels a read part-way through.
+    """
+    handover = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for item in aiterable:
+                handover.put_nowait((item, None))
+            handover.put_nowait((_STREAM_END, None))
+        except Exception as e:
+            handover.put_nowait((_STREAM_END, e))
+
+    task = asyncio.ensure_future(pump())
+    try:
+        while True:
+            try:
+                item, error = await asyncio.wait_for(handover.get(), idle_timeout())
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if item is _STREAM_END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        task.cancel()
+
+class TokenBatcher:
+    """Coalesce streamed tokens into fewer, larger chunks for the HTTP client"""
+    __slots__ = ('parts', 'size', 'last_flush')
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+
+    def add(self, text: str) -> Optional[bytes]:
+        """Buffer a token, returning the batch once it is big or old enough"""
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= STREAM_BATCH_CHARS or time.monotonic() - self.last_flush >= STREAM_BATCH_INTERVAL:
+            return self.flush()
+        return None
+
+    def due_in(self) -> Optional[float]:
+        """Seconds until buffered tokens should be sent even if no more arrive, or None if there are none"""
+        if not self.parts:
+            return None
+        return max(self.last_flush + STREAM_BATCH_INTERVAL - time.monotonic(), 0)
+
+    def flush(self) -> bytes:
+        batch = ''.join(self.parts).encode('utf-8')
+        self.parts.clear()
+        self.size = 0
+        self.last_flush = time.monotonic()
+        return batch
+
+@app.on_event("startup")
+async def init_http_clients():
+    get_mcp_client()
+    get_ollama_client()
+
+@app.on_event("startup")
+async def preload_system_prompt():
+    # Read the system prompt before the first chat, and report a missing file at startup
+    # (requests keep raising their 500 until it exists)
+    try:
+        await load_file_cached_async(SYSTEM_PROMPT_PATH, _read_text)
+    except Exception as e:
+        log.error("Failed to load system prompt: %s", e)
+
+@app.on_event("startup")
+async def preload_restaurant_hours():
+    # Parse restaurants.json before the first "what's open" question
+    try:
+        await asyncio.to_thread(get_restaurant_hours)
+    except Exception as e:
+        log.error("Error loading restaurants.json: %s", e)
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    global MCP_CLIENT, OLLAMA_CLIENT
+    for client in (MCP_CLIENT, OLLAMA_CLIENT):
+        if client is not None:
+            await client.aclose()
+    MCP_CLIENT = OLLAMA_CLIENT = None
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,11 +366,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add this debug function at the top after your imports
-def debug_log(message: str):
-    """Enhanced debug logging"""
-    print(f"[DEBUG {datetime.datetime.now().strftime('%H:%M:%S')}] {message}")
-
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
@@ -61,33 +373,58 @@ class ChatRequest(BaseModel):
 def save_final_order_to_file(order_data: Dict):
     """Save completed order to final orders file"""
     try:
-        # Use 'a' mode to append orders to the file
-        with open(ORDERS_PATH, 'w', encoding='utf-8') as f:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"\n=== ORDER - {timestamp} ===\n")
-            
-            # Handle multiple items
-            if 'items' in order_data:
-                f.write("ITEMS:\n")
-                total_cost = 0
-                for item in order_data['items']:
-                    qty = item.get('quantity', 1)
-                    price = item.get('price', 0)
-                    total_price = item.get('total_price', price * qty)
-                    total_cost += total_price
-                    f.write(f"- {qty}x {item['name']}: AED {price} each = AED {total_price}\n")
-                f.write(f"TOTAL COST: AED {total_cost:.2f}\n")
-            
-            f.write(f"RF ID: +{order_data.get('rf_id', 'N/A')}\n")
-            f.write(f"Building: {order_data.get('building', 'N/A')}\n")
-            f.write(f"Phone: {order_data.get('phone', 'N/A')}\n")
-            f.write(f"Special Request: {order_data.get('special_request', 'None')}\n")
-            f.write("=" * 50 + "\n")
-            
-        print(f"DEBUG: Saved final order to file")
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        parts = [f"\n=== ORDER - {timestamp} ===\n"]
+        
+        # Handle multiple items
+        if 'items' in order_data:
+            parts.append("ITEMS:\n")
+            total_cost = 0
+            for item in order_data['items']:
+                qty = item.get('quantity', 1)
+                price = item.get('price', 0)
+                total_price = item.get('total_price', price * qty)
+                total_cost += total_price
+                parts.append(f"- {qty}x {item['name']}: AED {price} each = AED {total_price}\n")
+            parts.append(f"TOTAL COST: AED {total_cost:.2f}\n")
+        
+        parts.append(f"RF ID: +{order_data.get('rf_id', 'N/A')}\n")
+        parts.append(f"Building: {order_data.get('building', 'N/A')}\n")
+        parts.append(f"Phone: {order_data.get('phone', 'N/A')}\n")
+        parts.append(f"Special Request: {order_data.get('special_request', 'None')}\n")
+        parts.append("=" * 50 + "\n")
+        
+        # The file holds the latest order; the artifact writer thread rewrites it off the event loop.
+        # It is rewritten in place, since order_printer.py prints on the file's modify events
+        ARTIFACT_WRITER.overwrite(ORDERS_PATH, ''.join(parts).encode('utf-8'))
+        log.debug("Queued final order for saving")
         
     except Exception as e:
-        print(f"Error saving order: {e}")
+        log.error("Error saving order: %s", e)
+
+# Input formats, compiled once for the validators and extractors below
+RF_ID_RE = re.compile(r'\b(\d{6})\b')
+RF_ID_CANDIDATE_RE = re.compile(r'\b(\d{4,7})\b')
+BUILDING_CODE_RE = re.compile(r'\b(A\d[ABC]|[AFC]\d)\b', re.IGNORECASE)
+BUILDING_CANDIDATE_RE = re.compile(r'\b([A-Z]\d[A-Z]?)\b', re.IGNORECASE)
+NUMBER_CANDIDATE_RE = re.compile(r'\b(\d{4,15})\b')
+# UAE mobile formats, each with the prefix that normalizes its match to 05xxxxxxxx
+PHONE_PATTERNS = (
+    (re.compile(r'\b(05\d{8})\b'), ''),         # 10 digits starting with 05
+    (re.compile(r'\b(5\d{8})\b'), '0'),         # 9 digits starting with 5
+    (re.compile(r'\b\+971(5\d{8})\b'), '0'),    # +971 followed by 9 digits starting with 5
+    (re.compile(r'\b971(5\d{8})\b'), '0'),      # 971 followed by 9 digits starting with 5
+)
+# Spaces, hyphens and parentheses removed before looking for a phone number
+PHONE_SEPARATORS = str.maketrans('', '', ' -()')
+
+def normalize_phone(cleaned_text: str) -> Optional[str]:
+    """Find the first UAE mobile number in separator-free text, as 05xxxxxxxx"""
+    for pattern, prefix in PHONE_PATTERNS:
+        phone_match = pattern.search(cleaned_text)
+        if phone_match:
+            return prefix + phone_match.group(1)
+    return None
 
 # Individual Validation Functions (kept for tool system)
 def validate_rf_id(text: str) -> Dict[str, Union[str, bool]]:
@@ -96,7 +433,7 @@ def validate_rf_id(text: str) -> Dict[str, Union[str, bool]]:
         return {"valid": False, "message": "No RF ID found", "rf_id": None}
     
     # Find any 6-digit number in the text
-    rf_id_match = re.search(r'\b(\d{6})\b', text)
+    rf_id_match = RF_ID_RE.search(text)
     if not rf_id_match:
         return {"valid": False, "message": "RF ID must be exactly 6 digits", "rf_id": None}
     
@@ -109,33 +446,9 @@ def validate_phone_number(text: str) -> Dict[str, Union[str, bool]]:
         return {"valid": False, "message": "No phone number found", "phone": None}
     
     # Clean the text of spaces, hyphens, and parentheses
-    cleaned_text = text.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-    
-    # Define UAE phone patterns
-    phone_patterns = [
-        r'\b(05\d{8})\b',           # 10 digits starting with 05
-        r'\b(5\d{8})\b',            # 9 digits starting with 5
-        r'\b\+971(5\d{8})\b',       # +971 followed by 9 digits starting with 5
-        r'\b971(5\d{8})\b',         # 971 followed by 9 digits starting with 5
-    ]
-    
-    for pattern in phone_patterns:
-        phone_match = re.search(pattern, cleaned_text)
-        if phone_match:
-            if pattern == r'\b(05\d{8})\b':
-                # Already in correct format
-                phone = phone_match.group(1)
-                return {"valid": True, "message": "Valid phone number", "phone": phone}
-            
-            elif pattern == r'\b(5\d{8})\b':
-                # Add leading 0
-                phone = '0' + phone_match.group(1)
-                return {"valid": True, "message": "Valid phone number", "phone": phone}
-            
-            elif pattern in [r'\b\+971(5\d{8})\b', r'\b971(5\d{8})\b']:
-                # Extract the 9-digit part and add leading 0
-                phone = '0' + phone_match.group(1)
-                return {"valid": True, "message": "Valid phone number", "phone": phone}
+    phone = normalize_phone(text.translate(PHONE_SEPARATORS))
+    if phone:
+        return {"valid": True, "message": "Valid phone number", "phone": phone}
     
     return {"valid": False, "message": "Invalid UAE mobile number format. Accepted formats: 05xxxxxxxx, 5xxxxxxxx, +9715xxxxxxxx, 9715xxxxxxxx", "phone": None}
 
@@ -145,13 +458,13 @@ def validate_building(text: str) -> Dict[str, Union[str, bool]]:
         return {"valid": False, "message": "No building number found", "building": None}
     
     # Find building number pattern (A1A, A2B, F1, C2, etc.)
-    building_match = re.search(r'\b(A\d[ABC]|[AFC]\d)\b', text, re.IGNORECASE)
+    building_match = BUILDING_CODE_RE.search(text)
     if not building_match:
-        return {"valid": False, "message": f"Building must be one of: {', '.join(sorted(AVAILABLE_BUILDINGS))}", "building": None}
+        return {"valid": False, "message": f"Building must be one of: {AVAILABLE_BUILDINGS_SORTED_JOINED}", "building": None}
     
     building = building_match.group(1).upper()
-    if building not in AVAILABLE_BUILDINGS:
-        return {"valid": False, "message": f"Invalid building. Must be one of: {', '.join(sorted(AVAILABLE_BUILDINGS))}", "building": None}
+    if building not in AVAILABLE_BUILDINGS_SET:
+        return {"valid": False, "message": f"Invalid building. Must be one of: {AVAILABLE_BUILDINGS_SORTED_JOINED}", "building": None}
     
     return {"valid": True, "message": "Valid building", "building": building}
 
@@ -163,10 +476,10 @@ def validate_and_update_order_state(user_message: str, order_state) -> Optional[
     Returns error message if validation fails, None if valid or no validation needed.
     """
     user_message_lower = user_message.lower()
-    debug_log(f"Validating input: '{user_message}'")
+    log.debug("Validating input: '%s'", user_message)
     
     # Extract potential RFID (6 digits)
-    rf_id_match = re.search(r'\b(\d{4,7})\b', user_message)
+    rf_id_match = RF_ID_CANDIDATE_RE.search(user_message)
     if rf_id_match:
         potential_rfid = rf_id_match.group(1)
         if len(potential_rfid) != 6:
@@ -177,62 +490,41 @@ def validate_and_update_order_state(user_message: str, order_state) -> Optional[
         
         # If we reach here, RFID is valid - update order state
         order_state.rf_id = potential_rfid
-        debug_log(f"Updated RFID to {potential_rfid}")
+        log.debug("Updated RFID to %s", potential_rfid)
     
     # Extract potential building number - FIXED REGEX
-    building_match = re.search(r'\b([A-Z]\d[A-Z]?)\b', user_message, re.IGNORECASE)
+    building_match = BUILDING_CANDIDATE_RE.search(user_message)
     if building_match:
         potential_building = building_match.group(1).upper()
-        debug_log(f"Found potential building: {potential_building}")
+        log.debug("Found potential building: %s", potential_building)
         
         # Check against available buildings
-        if potential_building not in AVAILABLE_BUILDINGS:
-            debug_log(f"Building {potential_building} is INVALID")
-            return f"'{potential_building}' is not a valid building. Please choose from: {', '.join(sorted(AVAILABLE_BUILDINGS))}"
+        if potential_building not in AVAILABLE_BUILDINGS_SET:
+            log.debug("Building %s is INVALID", potential_building)
+            return f"'{potential_building}' is not a valid building. Please choose from: {AVAILABLE_BUILDINGS_SORTED_JOINED}"
         
         # If we reach here, building is valid - update order state
         order_state.building = potential_building
-        debug_log(f"Updated building to {potential_building}")
+        log.debug("Updated building to %s", potential_building)
     
     # Extract potential phone number (UAE mobile patterns)
-    phone_patterns = [
-        r'\b(05\d{8})\b',           # 10 digits starting with 05
-        r'\b(5\d{8})\b',            # 9 digits starting with 5  
-        r'\b\+971(5\d{8})\b',       # +971 followed by 9 digits starting with 5
-        r'\b971(5\d{8})\b',         # 971 followed by 9 digits starting with 5
-    ]
-    
-    cleaned_message = user_message.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
+    cleaned_message = user_message.translate(PHONE_SEPARATORS)
     
     # Check if there's any number that looks like it might be a phone number
-    any_number_match = re.search(r'\b(\d{4,15})\b', cleaned_message)
+    any_number_match = NUMBER_CANDIDATE_RE.search(cleaned_message)
     if any_number_match:
         potential_number = any_number_match.group(1)
         
         # Check if it matches any of our valid patterns
-        valid_phone_found = False
-        for pattern in phone_patterns:
-            phone_match = re.search(pattern, cleaned_message)
-            if phone_match:
-                if pattern == r'\b(05\d{8})\b':
-                    # Already in correct format
-                    normalized_phone = phone_match.group(1)
-                elif pattern == r'\b(5\d{8})\b':
-                    # Add leading 0
-                    normalized_phone = '0' + phone_match.group(1)
-                elif pattern in [r'\b\+971(5\d{8})\b', r'\b971(5\d{8})\b']:
-                    # Extract the 9-digit part and add leading 0
-                    normalized_phone = '0' + phone_match.group(1)
-                
-                # Phone is valid - update order state
-                order_state.phone = normalized_phone
-                debug_log(f"Updated phone to {normalized_phone}")
-                valid_phone_found = True
-                break
+        normalized_phone = normalize_phone(cleaned_message)
+        if normalized_phone:
+            # Phone is valid - update order state
+            order_state.phone = normalized_phone
+            log.debug("Updated phone to %s", normalized_phone)
         
         # If we found a number but it doesn't match valid patterns, return error
-        if not valid_phone_found:
-            debug_log(f"Invalid phone number detected: {potential_number}")
+        else:
+            log.debug("Invalid phone number detected: %s", potential_number)
             return f"Invalid phone number '{potential_number}'. Please provide a UAE mobile number in one of these formats: 05xxxxxxxx, 5xxxxxxxx, +9715xxxxxxxx, or 9715xxxxxxxx"
     
     # No validation errors found
@@ -278,7 +570,7 @@ VALIDATION_TOOLS = [
         "type": "function",
         "function": {
             "name": "validate_building",
-            "description": f"Validate if the text contains a valid building number (must be one of: {', '.join(sorted(AVAILABLE_BUILDINGS))})",
+            "description": f"Validate if the text contains a valid building number (must be one of: {AVAILABLE_BUILDINGS_SORTED_JOINED})",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -329,14 +621,13 @@ async def analyze_conversation_with_llm(conversation: List[Dict], session_id: st
     Use LLM to analyze conversation and extract order details
     Returns order data if found, None otherwise
     """
-    debug_log("Using LLM to analyze conversation for order details")
+    log.debug("Using LLM to analyze conversation for order details")
     
     # Build conversation text
-    conversation_text = ""
-    for msg in conversation[-10:]:  # Last 10 messages for context
-        sender = msg['sender']
-        message = msg['message']
-        conversation_text += f"{sender.title()}: {message}\n"
+    conversation_text = ''.join(
+        f"{msg['sender'].title()}: {msg['message']}\n"
+        for msg in conversation[-10:]  # Last 10 messages for context
+    )
     
     # Create analysis prompt
     analysis_prompt = f"""Analyze this conversation between a user and a food ordering assistant. Extract order details if an order is being placed.
@@ -385,71 +676,71 @@ If no confirmed order found, respond: {{"has_order": false}}"""
 
     try:
         # Send to LLM for analysis
-        async with httpx.AsyncClient(timeout=30) as client:
-            payload = {
-                "model": OLLAMA_MODEL,
-                "prompt": analysis_prompt,
-                "stream": False,
-                "temperature": 0.1,  # Low temperature for consistent parsing
-                "stop": ["\n\n", "User:", "Assistant:"]
-            }
+        client = get_ollama_client()
+        payload = {
+            "model": OLLAMA_MODEL,
+            "prompt": analysis_prompt,
+            "stream": False,
+            "temperature": 0.1,  # Low temperature for consistent parsing
+            "stop": ["\n\n", "User:", "Assistant:"]
+        }
             
-            response = await client.post(OLLAMA_URL, json=payload)
-            if response.status_code == 200:
-                result = response.json()
-                llm_response = result.get("response", "").strip()
+        response = await client.post(OLLAMA_URL, content=_dumps_json(payload), headers=JSON_HEADERS, timeout=30)
+        if response.status_code == 200:
+            result = _loads_json(response.content)
+            llm_response = result.get("response", "").strip()
                 
-                debug_log(f"LLM analysis response: {llm_response}")
+            log.debug("LLM analysis response: %s", llm_response)
                 
-                # Try to parse JSON response
-                try:
-                    # Clean up response - sometimes LLM adds extra text
-                    json_start = llm_response.find('{')
-                    json_end = llm_response.rfind('}') + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_text = llm_response[json_start:json_end]
-                        order_analysis = json.loads(json_text)
+            # Try to parse JSON response
+            try:
+                # Clean up response - sometimes LLM adds extra text
+                json_start = llm_response.find('{')
+                json_end = llm_response.rfind('}') + 1
+                if json_start >= 0 and json_end > json_start:
+                    json_text = llm_response[json_start:json_end]
+                    order_analysis = _loads_json(json_text)
                         
-                        debug_log(f"Parsed LLM analysis: {order_analysis}")
+                    log.debug("Parsed LLM analysis: %s", order_analysis)
                         
-                        # Validate the analysis
-                        if order_analysis.get("has_order") and order_analysis.get("order_confirmed"):
-                            # Additional validation
-                            items = order_analysis.get("items", [])
-                            customer_info = order_analysis.get("customer_info", {})
+                    # Validate the analysis
+                    if order_analysis.get("has_order") and order_analysis.get("order_confirmed"):
+                        # Additional validation
+                        items = order_analysis.get("items", [])
+                        customer_info = order_analysis.get("customer_info", {})
                             
-                            if items and customer_info.get("rfid") and customer_info.get("building"):
-                                # Format for our system
-                                formatted_order = {
-                                    "items": items,
-                                    "total_cost": order_analysis.get("total_cost", 0),
-                                    "rf_id": customer_info.get("rfid"),
-                                    "building": customer_info.get("building"),
-                                    "phone": customer_info.get("phone", "Not provided"),
-                                    "special_request": customer_info.get("special_request", "None"),
-                                    "is_complete": True,
-                                    "rf_id_valid": True,
-                                    "building_valid": True,
-                                    "valid_phone": bool(customer_info.get("phone")),
-                                    "confidence": order_analysis.get("confidence", "medium")
-                                }
+                        if items and customer_info.get("rfid") and customer_info.get("building"):
+                            # Format for our system
+                            formatted_order = {
+                                "items": items,
+                                "total_cost": order_analysis.get("total_cost", 0),
+                                "rf_id": customer_info.get("rfid"),
+                                "building": customer_info.get("building"),
+                                "phone": customer_info.get("phone", "Not provided"),
+                                "special_request": customer_info.get("special_request", "None"),
+                                "is_complete": True,
+                                "rf_id_valid": True,
+                                "building_valid": True,
+                                "valid_phone": bool(customer_info.get("phone")),
+                                "confidence": order_analysis.get("confidence", "medium")
+                            }
                                 
-                                debug_log(f"LLM extracted valid order: {formatted_order}")
-                                return formatted_order
+                            log.debug("LLM extracted valid order: %s", formatted_order)
+                            return formatted_order
                         
-                        debug_log("LLM analysis indicates no confirmed order")
-                        return None
-                        
-                except json.JSONDecodeError as e:
-                    debug_log(f"Failed to parse LLM JSON response: {e}")
-                    debug_log(f"Raw response: {llm_response}")
+                    log.debug("LLM analysis indicates no confirmed order")
                     return None
-            else:
-                debug_log(f"LLM request failed: {response.status_code}")
+                        
+            except json.JSONDecodeError as e:
+                log.debug("Failed to parse LLM JSON response: %s", e)
+                log.debug("Raw response: %s", llm_response)
                 return None
+        else:
+            log.debug("LLM request failed: %s", response.status_code)
+            return None
                 
     except Exception as e:
-        debug_log(f"Error in LLM conversation analysis: {e}")
+        log.debug("Error in LLM conversation analysis: %s", e)
         return None
 
 async def detect_order_confirmation_and_save_with_llm(session_id: str, bot_response: str, user_message: str) -> bool:
@@ -457,39 +748,39 @@ async def detect_order_confirmation_and_save_with_llm(session_id: str, bot_respo
     Use LLM to detect and save confirmed orders
     Returns True if order was saved, False otherwise
     """
-    debug_log(f"Using LLM to detect order confirmation")
+    log.debug("Using LLM to detect order confirmation")
     
     # Check if order was already saved for this session
     order_state = get_or_create_order_state(session_id)
     if order_state.order_saved:
-        debug_log("Order already saved for this session, skipping LLM analysis")
+        log.debug("Order already saved for this session, skipping LLM analysis")
         return False
     
     # Get conversation
-    conversation = ConversationLogger.get_conversation(session_id)
+    conversation = await asyncio.to_thread(ConversationLogger.get_conversation, session_id)
     
     # Use LLM to analyze conversation
     order_data = await analyze_conversation_with_llm(conversation, session_id)
     
     if not order_data:
-        debug_log("LLM found no confirmed order")
+        log.debug("LLM found no confirmed order")
         return False
     
     # Only save if the order is COMPLETE (has all required information)
     if (order_data.get('items') and order_data.get('rf_id') and 
         order_data.get('building') and order_data.get('phone')):
-        debug_log("LLM DETECTED COMPLETE CONFIRMED ORDER!")
-        debug_log(f"SAVING LLM ORDER: Items: {len(order_data['items'])}, RFID: {order_data['rf_id']}, Building: {order_data['building']}, Total: {order_data['total_cost']}")
+        log.debug("LLM DETECTED COMPLETE CONFIRMED ORDER!")
+        log.debug("SAVING LLM ORDER: Items: %d, RFID: %s, Building: %s, Total: %s", len(order_data['items']), order_data['rf_id'], order_data['building'], order_data['total_cost'])
         save_final_order_to_file(order_data)
         
         # Mark as saved and clean up session
         order_state.mark_as_saved()
         order_state.reset()
         
-        debug_log("Order saved successfully via LLM analysis")
+        log.debug("Order saved successfully via LLM analysis")
         return True
     else:
-        debug_log(f"LLM found order but not complete - Items: {len(order_data.get('items', []))}, RFID: {bool(order_data.get('rf_id'))}, Building: {bool(order_data.get('building'))}, Phone: {bool(order_data.get('phone'))}")
+        log.debug("LLM found order but not complete - Items: %d, RFID: %s, Building: %s, Phone: %s", len(order_data.get('items', [])), bool(order_data.get('rf_id')), bool(order_data.get('building')), bool(order_data.get('phone')))
         return False
 
 def normalize_order_items(items):
@@ -500,7 +791,7 @@ def normalize_order_items(items):
     valid_items = []
     for item in items or []:
         if not isinstance(item, dict):
-            print(f"[normalize_order_items] Skipping non-dict item: {item}")
+            log.debug("[normalize_order_items] Skipping non-dict item: %s", item)
             continue
         if 'name' in item and 'price' in item:
             # Ensure quantity and total_price
@@ -514,10 +805,17 @@ def normalize_order_items(items):
                 'total_price': total_price
             })
         else:
-            print(f"[normalize_order_items] Skipping invalid or category item: {item}")
+            log.debug("[normalize_order_items] Skipping invalid or category item: %s", item)
     return valid_items
 
 class OrderState:
+    # One instance per session; slots keep it compact and attribute access fast
+    __slots__ = (
+        'in_order_flow', 'rf_id', 'building', 'phone', 'items',
+        'total_cost', 'special_request', 'order_saved',
+        'history_lines', 'history_len', 'history_tail', 'history_dropped'
+    )
+
     def __init__(self):
         self.in_order_flow = False
         self.rf_id = None
@@ -527,6 +825,11 @@ class OrderState:
         self.total_cost = 0.0
         self.special_request = None
         self.order_saved = False  # Flag to prevent duplicate saves
+        # Rendered prompt lines for the chat history seen so far (see render_history_prompt)
+        self.history_lines = []
+        self.history_len = 0
+        self.history_tail = None
+        self.history_dropped = 0
 
     def start_order(self, items, total_cost):
         self.in_order_flow = True
@@ -540,12 +843,12 @@ class OrderState:
         self.items = normalize_order_items(items)
         self.total_cost = total_cost
         self.order_saved = False  # Reset save flag when items change
-        debug_log(f"Order state updated - Items: {len(self.items)}, Total: {self.total_cost}")
+        log.debug("Order state updated - Items: %d, Total: %s", len(self.items), self.total_cost)
 
     def mark_as_saved(self):
         """Mark this order as already saved to prevent duplicates"""
         self.order_saved = True
-        debug_log("Order marked as saved")
+        log.debug("Order marked as saved")
 
     def reset(self):
         self.__init__()
@@ -569,11 +872,78 @@ def quick_error_response(error_message: str) -> str:
     """Generate a quick error response without LLM processing"""
     return error_message
 
+# Most recent chat history lines included in the prompt. The history sits right after the static
+# system prompt, so Ollama reuses its cached prefix only while the first history line stays put;
+# once over the window the oldest lines are dropped HISTORY_TRIM_BLOCK at a time rather than one per turn
+HISTORY_PROMPT_WINDOW = 40
+HISTORY_TRIM_BLOCK = 20
+
+def render_history_prompt(order_state: OrderState, history: List[Dict]) -> str:
+    """Render the chat history for the prompt, formatting only messages added since the last turn"""
+    n = order_state.history_len
+    lines = order_state.history_lines
+    dropped = order_state.history_dropped
+    # The client resends the whole history each turn; anything but a grown copy is rendered afresh
+    if n > len(history) or (n and (history[n - 1].get("sender"), history[n - 1].get("text")) != order_state.history_tail):
+        n = 0
+        lines = []
+        dropped = 0
+    for msg in history[n:]:
+        if msg.get("sender") == "user":
+            lines.append(f"User: {msg['text']}\n")
+        elif msg.get("sender") == "bot":
+            lines.append(f"Assistant: {msg['text']}\n")
+    total = dropped + len(lines)
+    if total > HISTORY_PROMPT_WINDOW:
+        # Cut at a multiple of the block, so rendering the same history afresh keeps the same lines
+        start = -(-(total - HISTORY_PROMPT_WINDOW) // HISTORY_TRIM_BLOCK) * HISTORY_TRIM_BLOCK
+        del lines[:start - dropped]
+        dropped = start
+    order_state.history_lines = lines
+    order_state.history_dropped = dropped
+    order_state.history_len = len(history)
+    order_state.history_tail = (history[-1].get("sender"), history[-1].get("text")) if history else None
+    return ''.join(lines)
+
 def get_or_create_order_state(session_id: str) -> OrderState:
     if session_id not in order_states:
         order_states[session_id] = OrderState()
     return order_states[session_id]
 
+# Fallback extraction patterns, compiled once
+# Bot summary format "- Item: X\n- Price: AED Y" (separate lines)
+FALLBACK_ITEM_RE = re.compile(r'-\s*Item:\s*([^\n]+)', re.IGNORECASE)
+FALLBACK_PRICE_RE = re.compile(r'-\s*Price:\s*AED\s*([\d.]+)', re.IGNORECASE)
+# Bot response with "X Item for total of AED Y"
+FALLBACK_BOT_ORDER_RE = re.compile(r'(\d+)\s*([^f]*?)\s*for.*?total.*?AED\s*([\d.]+)', re.IGNORECASE)
+# "X x Y.0 + Z x W.0" calculation format
+FALLBACK_CALCULATION_RE = re.compile(r'(\d+)\s*x\s*([\d.]+)\s*\+\s*(\d+)\s*x\s*([\d.]+)')
+# Potential item names in the conversation
+FALLBACK_CONVERSATION_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    # Enhanced patterns to handle more variations
+    r'i\s*want\s*to\s*get\s*a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
+    r'i\s*want\s*to\s*order\s*a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
+    r'order\s*a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
+    r'get\s*a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
+    r'(\d+)\s+([a-zA-Z\s]+?)(?:\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
+    
+    # More flexible patterns for different sentence structures
+    r'want\s+a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my|\s+rfid|\s+building|\s+phone)',
+    r'get\s+a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my|\s+rfid|\s+building|\s+phone)',
+    r'order\s+a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my|\s+rfid|\s+building|\s+phone)',
+    
+    # Pattern specifically for "Chicken Dynamite" style names
+    r'([A-Z][a-zA-Z]*\s+[A-Z][a-zA-Z]*)',  # Captures "Chicken Dynamite"
+))
+# Quantities, extracted separately
+FALLBACK_QUANTITY_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r'i\s+want\s+(\d+)\s+of\s+them',
+    r'(\d+)\s+of\s+them',
+    r'want\s+(\d+)',
+    r'get\s+(\d+)',
+    r'order\s+(\d+)',
+))
+
 # FALLBACK ITEM EXTRACTION (kept as fallback)
 async def extract_items_fallback(combined_text: str, bot_response: str) -> List[Dict]:
     """
@@ -581,15 +951,12 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
     """
     items = []
     
-    print(f"[FALLBACK] Bot response: '{bot_response}'")
-    print(f"[FALLBACK] Combined text: '{combined_text[:200]}...'")
+    log.debug("[FALLBACK] Bot response: '%s'", bot_response)
+    log.debug("[FALLBACK] Combined text: '%.200s...'", combined_text)
     
     # Pattern 1: Bot summary format "- Item: X\n- Price: AED Y" (separate lines)
-    item_pattern = r'-\s*Item:\s*([^\n]+)'
-    price_pattern = r'-\s*Price:\s*AED\s*([\d.]+)'
-    
-    item_match = re.search(item_pattern, bot_response, re.IGNORECASE)
-    price_match = re.search(price_pattern, bot_response, re.IGNORECASE)
+    item_match = FALLBACK_ITEM_RE.search(bot_response)
+    price_match = FALLBACK_PRICE_RE.search(bot_response)
     
     if item_match and price_match:
         item_name = item_match.group(1).strip()
@@ -607,15 +974,16 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
             r'get\s*(\d+)'
         ]
         
+        combined_lower = combined_text.lower()
         for pattern in qty_patterns:
-            qty_match = re.search(pattern, combined_text.lower())
+            qty_match = re.search(pattern, combined_lower)
             if qty_match:
                 try:
                     potential_qty = int(qty_match.group(1))
                     # Only use reasonable quantities (1-50)
                     if 1 <= potential_qty <= 50:
                         qty = potential_qty
-                        print(f"[FALLBACK] Found quantity {qty} with pattern: {pattern}")
+                        log.debug("[FALLBACK] Found quantity %s with pattern: %s", qty, pattern)
                         break
                 except (ValueError, IndexError):
                     continue
@@ -630,12 +998,11 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
             'quantity': qty,
             'total_price': price * qty
         })
-        print(f"[FALLBACK] Extracted from bot summary: {qty}x {item_name} @ AED {price} = AED {price * qty}")
+        log.debug("[FALLBACK] Extracted from bot summary: %sx %s @ AED %s = AED %s", qty, item_name, price, price * qty)
         return items
     
     # Pattern 2: Bot response with "X Item for total of AED Y"
-    bot_order_pattern = r'(\d+)\s*([^f]*?)\s*for.*?total.*?AED\s*([\d.]+)'
-    bot_match = re.search(bot_order_pattern, bot_response, re.IGNORECASE)
+    bot_match = FALLBACK_BOT_ORDER_RE.search(bot_response)
     
     if bot_match:
         qty = int(bot_match.group(1))
@@ -652,15 +1019,14 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
             'quantity': qty,
             'total_price': total_price
         })
-        print(f"[FALLBACK] Extracted from bot order: {qty}x {item_name} @ AED {price_per_item} = AED {total_price}")
+        log.debug("[FALLBACK] Extracted from bot order: %sx %s @ AED %s = AED %s", qty, item_name, price_per_item, total_price)
         return items
     
     # Pattern 3: "X x Y.0 + Z x W.0" calculation format
-    calculation_pattern = r'(\d+)\s*x\s*([\d.]+)\s*\+\s*(\d+)\s*x\s*([\d.]+)'
-    calc_match = re.search(calculation_pattern, bot_response)
+    calc_match = FALLBACK_CALCULATION_RE.search(bot_response)
     
     if calc_match:
-        print(f"[FALLBACK] Found calculation: {calc_match.groups()}")
+        log.debug("[FALLBACK] Found calculation: %s", calc_match.groups())
         qty1, price1, qty2, price2 = calc_match.groups()
         
         # Try to find what items these refer to using MCP
@@ -668,7 +1034,7 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
         
         if 'pepperoni' in bot_text_before_calc.lower():
             # Query MCP for pepperoni details
-            pepperoni_item = await fetch_menu_item_from_mcp("Pepperoni Pizza")
+            pepperoni_item = await lookup_menu_item("Pepperoni Pizza")
             if pepperoni_item:
                 items.append({
                     'name': pepperoni_item['name'],
@@ -683,11 +1049,11 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
                     'quantity': int(qty1),
                     'total_price': float(price1) * int(qty1)
                 })
-            print(f"[FALLBACK] Added Pepperoni Pizza: {int(qty1)}x AED {price1}")
+            log.debug("[FALLBACK] Added Pepperoni Pizza: %dx AED %s", int(qty1), price1)
         
         if 'french fries' in bot_text_before_calc.lower():
             # Query MCP for fries details
-            fries_item = await fetch_menu_item_from_mcp("French Fries")
+            fries_item = await lookup_menu_item("French Fries")
             if fries_item:
                 items.append({
                     'name': fries_item['name'],
@@ -702,39 +1068,12 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
                     'quantity': int(qty2),
                     'total_price': float(price2) * int(qty2)
                 })
-            print(f"[FALLBACK] Added French Fries: {int(qty2)}x AED {price2}")
+            log.debug("[FALLBACK] Added French Fries: %dx AED %s", int(qty2), price2)
         
         return items
     
     # Pattern 4: Extract from conversation and query MCP
-    print("[FALLBACK] No bot patterns found, trying conversation extraction with MCP...")
-    
-    # Extract potential item names from conversation
-    conversation_patterns = [
-        # Enhanced patterns to handle more variations
-        r'i\s*want\s*to\s*get\s*a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
-        r'i\s*want\s*to\s*order\s*a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
-        r'order\s*a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
-        r'get\s*a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
-        r'(\d+)\s+([a-zA-Z\s]+?)(?:\s+my\s+rfid|\s+rfid|\s+building|\s+phone|\s*$)',
-        
-        # More flexible patterns for different sentence structures
-        r'want\s+a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my|\s+rfid|\s+building|\s+phone)',
-        r'get\s+a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my|\s+rfid|\s+building|\s+phone)',
-        r'order\s+a?\s*([a-zA-Z\s]+?)(?:\s+yes|\s+\d+|\s+my|\s+rfid|\s+building|\s+phone)',
-        
-        # Pattern specifically for "Chicken Dynamite" style names
-        r'([A-Z][a-zA-Z]*\s+[A-Z][a-zA-Z]*)',  # Captures "Chicken Dynamite"
-    ]
-    
-    # Extract quantities separately
-    quantity_patterns = [
-        r'i\s+want\s+(\d+)\s+of\s+them',
-        r'(\d+)\s+of\s+them',
-        r'want\s+(\d+)',
-        r'get\s+(\d+)',
-        r'order\s+(\d+)',
-    ]
+    log.debug("[FALLBACK] No bot patterns found, trying conversation extraction with MCP...")
     
     # Find potential item names
     potential_items = []
@@ -743,23 +1082,23 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
     text_to_search = combined_text.lower()
     
     # Extract quantity first
-    for pattern in quantity_patterns:
-        qty_match = re.search(pattern, text_to_search)
+    for pattern in FALLBACK_QUANTITY_PATTERNS:
+        qty_match = pattern.search(text_to_search)
         if qty_match:
             try:
                 qty = int(qty_match.group(1))
                 if 1 <= qty <= 50:  # Reasonable range
                     potential_quantity = qty
-                    print(f"[FALLBACK] Found quantity: {potential_quantity}")
+                    log.debug("[FALLBACK] Found quantity: %s", potential_quantity)
                     break
             except (ValueError, IndexError):
                 continue
     
     # Extract item names
-    for pattern in conversation_patterns:
-        print(f"[FALLBACK] Trying pattern: {pattern}")
-        matches = re.findall(pattern, text_to_search, re.IGNORECASE)
-        print(f"[FALLBACK] Pattern matches: {matches}")
+    for pattern in FALLBACK_CONVERSATION_PATTERNS:
+        log.debug("[FALLBACK] Trying pattern: %s", pattern.pattern)
+        matches = pattern.findall(text_to_search)
+        log.debug("[FALLBACK] Pattern matches: %s", matches)
         
         for match in matches:
             if isinstance(match, tuple):
@@ -783,10 +1122,10 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
             # Skip obvious non-items
             if (item_candidate in ['of', 'them', 'my', 'rfid', 'building', 'phone', 'number', 'a', 'the', 'yes'] 
                 or len(item_candidate) < 3 or item_candidate.isdigit()):
-                print(f"[FALLBACK] Skipping obvious non-item: '{item_candidate}'")
+                log.debug("[FALLBACK] Skipping obvious non-item: '%s'", item_candidate)
                 continue
             
-            print(f"[FALLBACK] Found potential item: '{item_candidate}'")
+            log.debug("[FALLBACK] Found potential item: '%s'", item_candidate)
             potential_items.append(item_candidate)
             
         # If we found any items from this pattern, stop trying other patterns
@@ -795,10 +1134,10 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
     
     # Query MCP for each potential item
     for item_candidate in potential_items:
-        print(f"[FALLBACK] Querying MCP for: '{item_candidate}'")
+        log.debug("[FALLBACK] Querying MCP for: '%s'", item_candidate)
         
         # Try exact match first
-        mcp_item = await fetch_menu_item_from_mcp(item_candidate)
+        mcp_item = await lookup_menu_item(item_candidate)
         
         # If no exact match, try variations
         if not mcp_item:
@@ -810,24 +1149,26 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
                 item_candidate.capitalize(),
             ]
             
-            for variation in variations:
-                print(f"[FALLBACK] Trying variation: '{variation}'")
-                mcp_item = await fetch_menu_item_from_mcp(variation)
-                if mcp_item:
-                    break
+            log.debug("[FALLBACK] Trying variations: %s", variations)
+            # Local menu first, then ask the MCP server about every variation at once;
+            # the earliest variation that matches wins either way
+            mcp_item = next(filter(None, map(lookup_item_local, variations)), None)
+            if not mcp_item:
+                results = await asyncio.gather(*map(fetch_menu_item_from_mcp, variations), return_exceptions=True)
+                mcp_item = next((result for result in results if result and not isinstance(result, BaseException)), None)
         
         if mcp_item:
-            print(f"[FALLBACK] Found in MCP: {mcp_item['name']} - AED {mcp_item['price']}")
+            log.debug("[FALLBACK] Found in MCP: %s - AED %s", mcp_item['name'], mcp_item['price'])
             items.append({
                 'name': mcp_item['name'],
                 'price': mcp_item['price'],
                 'quantity': potential_quantity,
                 'total_price': mcp_item['price'] * potential_quantity
             })
-            print(f"[FALLBACK] Added from MCP: {potential_quantity}x {mcp_item['name']} @ AED {mcp_item['price']}")
+            log.debug("[FALLBACK] Added from MCP: %sx %s @ AED %s", potential_quantity, mcp_item['name'], mcp_item['price'])
             break  # Found one item, stop looking
         else:
-            print(f"[FALLBACK] '{item_candidate}' not found in MCP")
+            log.debug("[FALLBACK] '%s' not found in MCP", item_candidate)
     
     # Deduplicate items based on name (in case multiple patterns matched the same item)
     seen_items = {}
@@ -839,11 +1180,21 @@ async def extract_items_fallback(combined_text: str, bot_response: str) -> List[
             seen_items[item_name] = True
             deduplicated_items.append(item)
         else:
-            print(f"[FALLBACK] Skipping duplicate item: {item['name']}")
+            log.debug("[FALLBACK] Skipping duplicate item: %s", item['name'])
     
-    print(f"[FALLBACK] Final items after deduplication: {deduplicated_items}")
+    log.debug("[FALLBACK] Final items after deduplication: %s", deduplicated_items)
     return deduplicated_items
 
+# RF ID patterns for the conversation, most specific first
+RFID_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'rfid.*?(\d{6})',
+    r'rf.*?id.*?(\d{6})',
+    r'\b(\d{6})\b',
+    r'id.*?(\d{6})'
+))
+BOT_RF_ID_RE = re.compile(r'(\d{6})')
+BOT_BUILDING_RE = re.compile(r'building\s*([A-Z]\d[A-Z]?)', re.IGNORECASE)
+
 # UNIFIED ORDER EXTRACTION FUNCTION
 async def extract_complete_order_data(conversation: List[Dict], session_id: str = None, for_confirmation: bool = False) -> Optional[Dict]:
     """
@@ -857,7 +1208,7 @@ async def extract_complete_order_data(conversation: List[Dict], session_id: str
     Returns:
         Dict with order data including items, rf_id, building, phone, special_request, validation status
     """
-    debug_log(f"Extracting complete order data - for_confirmation={for_confirmation}, session_id={session_id}")
+    log.debug("Extracting complete order data - for_confirmation=%s, session_id=%s", for_confirmation, session_id)
     
     user_messages = []
     bot_messages = []
@@ -872,7 +1223,7 @@ async def extract_complete_order_data(conversation: List[Dict], session_id: str
     combined_text = " ".join(user_messages)
     latest_bot_response = bot_messages[-1] if bot_messages else ""
     
-    debug_log(f"Analyzing combined text: '{combined_text[:200]}...'")
+    log.debug("Analyzing combined text: '%.200s...'", combined_text)
     
     # Get order state if available
     order_state = None
@@ -885,17 +1236,20 @@ async def extract_complete_order_data(conversation: List[Dict], session_id: str
     # First try RAG extraction from conversation
     items = rag_extract_menu_items(combined_text)
     items = normalize_order_items(items)
-    debug_log(f"RAG extracted {len(items)} items: {[item.get('name', 'Unknown') for item in items]}")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("RAG extracted %d items: %s", len(items), [item.get('name', 'Unknown') for item in items])
     
     # If RAG didn't find items, try fallback
     if not items:
         items = await extract_items_fallback(combined_text, latest_bot_response)
-        debug_log(f"Fallback extracted {len(items)} items: {[item.get('name', 'Unknown') for item in items]}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Fallback extracted %d items: %s", len(items), [item.get('name', 'Unknown') for item in items])
     
     # If still no items and we have order state, use order state items as last resort
     if not items and order_state and order_state.items:
         items = order_state.items
-        debug_log(f"Using items from order state as last resort: {[item.get('name', 'Unknown') for item in items]}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Using items from order state as last resort: %s", [item.get('name', 'Unknown') for item in items])
     
     # Extract RF ID with multiple patterns - prioritize order state for confirmations
     rf_id = None
@@ -904,33 +1258,26 @@ async def extract_complete_order_data(conversation: List[Dict], session_id: str
     if for_confirmation and order_state and order_state.rf_id:
         rf_id = order_state.rf_id
         rf_id_valid = True
-        debug_log(f"Got RFID from order state: {rf_id}")
+        log.debug("Got RFID from order state: %s", rf_id)
     else:
         # Try multiple RFID patterns
-        rfid_patterns = [
-            r'rfid.*?(\d{6})',
-            r'rf.*?id.*?(\d{6})',
-            r'\b(\d{6})\b',
-            r'id.*?(\d{6})'
-        ]
-        
-        for pattern in rfid_patterns:
-            rfid_match = re.search(pattern, combined_text, re.IGNORECASE)
+        for pattern in RFID_PATTERNS:
+            rfid_match = pattern.search(combined_text)
             if rfid_match:
                 potential_rfid = rfid_match.group(1)
                 if len(potential_rfid) == 6:
                     rf_id = potential_rfid
                     rf_id_valid = True
-                    debug_log(f"Found RFID with pattern '{pattern}': {rf_id}")
+                    log.debug("Found RFID with pattern '%s': %s", pattern.pattern, rf_id)
                     break
         
         # Also check bot response for RFID
         if not rf_id and for_confirmation:
-            bot_rfid_match = re.search(r'(\d{6})', latest_bot_response)
+            bot_rfid_match = BOT_RF_ID_RE.search(latest_bot_response)
             if bot_rfid_match:
                 rf_id = bot_rfid_match.group(1)
                 rf_id_valid = True
-                debug_log(f"Found RFID in bot response: {rf_id}")
+                log.debug("Found RFID in bot response: %s", rf_id)
     
     # Extract building - prioritize order state for confirmations
     building = None
@@ -938,22 +1285,22 @@ async def extract_complete_order_data(conversation: List[Dict], session_id: str
     
     if for_confirmation and order_state and order_state.building:
         building = order_state.building
-        building_valid = building in AVAILABLE_BUILDINGS
-        debug_log(f"Got building from order state: {building}")
+        building_valid = building in AVAILABLE_BUILDINGS_SET
+        log.debug("Got building from order state: %s", building)
     else:
-        building_match = re.search(r'\b([A-Z]\d[A-Z]?)\b', combined_text, re.IGNORECASE)
+        building_match = BUILDING_CANDIDATE_RE.search(combined_text)
         if building_match:
             building = building_match.group(1).upper()
-            building_valid = building in AVAILABLE_BUILDINGS
-            debug_log(f"Got building from conversation: {building}")
+            building_valid = building in AVAILABLE_BUILDINGS_SET
+            log.debug("Got building from conversation: %s", building)
         
         # Also check bot response
         if not building and for_confirmation:
-            bot_building_match = re.search(r'building\s*([A-Z]\d[A-Z]?)', latest_bot_response, re.IGNORECASE)
+            bot_building_match = BOT_BUILDING_RE.search(latest_bot_response)
             if bot_building_match:
                 building = bot_building_match.group(1).upper()
-                building_valid = building in AVAILABLE_BUILDINGS
-                debug_log(f"Found building in bot response: {building}")
+                building_valid = building in AVAILABLE_BUILDINGS_SET
+                log.debug("Found building in bot response: %s", building)
     
     # Extract phone with better patterns - prioritize order state for confirmations
     phone = None
@@ -962,67 +1309,35 @@ async def extract_complete_order_data(conversation: List[Dict], session_id: str
     if for_confirmation and order_state and order_state.phone:
         phone = order_state.phone
         valid_phone = True
-        debug_log(f"Got phone from order state: {phone}")
+        log.debug("Got phone from order state: %s", phone)
     else:
-        # Try UAE phone patterns
-        phone_patterns = [
-            r'\b(05\d{8})\b',           # 10 digits starting with 05
-            r'\b(5\d{8})\b',            # 9 digits starting with 5
-            r'\b\+971(5\d{8})\b',       # +971 followed by 9 digits starting with 5
-            r'\b971(5\d{8})\b',         # 971 followed by 9 digits starting with 5
-        ]
-        
-        # Clean combined text for phone extraction
-        cleaned_combined = combined_text.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-        
-        # Check combined text first
-        for pattern in phone_patterns:
-            phone_match = re.search(pattern, cleaned_combined, re.IGNORECASE)
-            if phone_match:
-                if pattern == r'\b(05\d{8})\b':
-                    # Already in correct format
-                    phone = phone_match.group(1)
-                elif pattern == r'\b(5\d{8})\b':
-                    # Add leading 0
-                    phone = '0' + phone_match.group(1)
-                elif pattern in [r'\b\+971(5\d{8})\b', r'\b971(5\d{8})\b']:
-                    # Extract the 9-digit part and add leading 0
-                    phone = '0' + phone_match.group(1)
-                
-                valid_phone = True
-                debug_log(f"Found phone in conversation: {phone}")
-                break
+        # Try UAE phone patterns, in the cleaned combined text first
+        phone = normalize_phone(combined_text.translate(PHONE_SEPARATORS))
+        if phone:
+            valid_phone = True
+            log.debug("Found phone in conversation: %s", phone)
         
         # Also check bot response with same patterns
         if not phone and for_confirmation:
-            cleaned_bot_response = latest_bot_response.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-            for pattern in phone_patterns:
-                bot_phone_match = re.search(pattern, cleaned_bot_response, re.IGNORECASE)
-                if bot_phone_match:
-                    if pattern == r'\b(05\d{8})\b':
-                        phone = bot_phone_match.group(1)
-                    elif pattern == r'\b(5\d{8})\b':
-                        phone = '0' + bot_phone_match.group(1)
-                    elif pattern in [r'\b\+971(5\d{8})\b', r'\b971(5\d{8})\b']:
-                        phone = '0' + bot_phone_match.group(1)
-                    
-                    valid_phone = True
-                    debug_log(f"Found phone in bot response: {phone}")
-                    break
+            phone = normalize_phone(latest_bot_response.translate(PHONE_SEPARATORS))
+            if phone:
+                valid_phone = True
+                log.debug("Found phone in bot response: %s", phone)
     
     # Extract special requests - prioritize order state for confirmations
     special_request = "None"
     if for_confirmation and order_state and order_state.special_request is not None:
         special_request = order_state.special_request
-        debug_log(f"Got special request from order state: {special_request}")
+        log.debug("Got special request from order state: %s", special_request)
     else:
         for msg in reversed(user_messages[-10:]):
-            if any(keyword in msg.lower() for keyword in ['special', 'request', 'note', 'dietary', 'allergy']):
-                if not any(word in msg.lower() for word in ['no', 'none', 'nothing']):
+            msg_lower = msg.lower()
+            if any(keyword in msg_lower for keyword in ('special', 'request', 'note', 'dietary', 'allergy')):
+                if not any(word in msg_lower for word in ('no', 'none', 'nothing')):
                     special_request = msg
                     break
     
-    debug_log(f"Final extraction - Items: {len(items)}, RFID: {rf_id}, Building: {building}, Phone: {phone}")
+    log.debug("Final extraction - Items: %d, RFID: %s, Building: %s, Phone: %s", len(items), rf_id, building, phone)
     
     # Check if we have all required fields and they're valid
     has_all_fields = (items and rf_id_valid and building_valid and valid_phone)
@@ -1066,51 +1381,52 @@ async def extract_complete_order_data(conversation: List[Dict], session_id: str
     
     return None
 
+# FINAL order confirmation phrases, as one alternation
+ORDER_CONFIRMATION_RE = re.compile('|'.join((
+    r'thank you for.*order',
+    r'order.*will be delivered',
+    r'have a great day',
+    r'enjoy your meal',
+    r'order.*confirmed',
+    r'order.*placed.*successfully',
+    r'order.*complete',
+    r'receipt.*dining hall',  # More specific final confirmation
+)))
+
 async def detect_order_confirmation_and_save(session_id: str, bot_response: str, user_message: str) -> bool:
     """
     Detect if the LLM just confirmed an order and save it to orders.txt
     Returns True if order was saved, False otherwise
     """
-    debug_log(f"Checking bot response for order confirmation: '{bot_response[:100]}...'")
+    log.debug("Checking bot response for order confirmation: '%.100s...'", bot_response)
     
     # Check if order was already saved for this session
     order_state = get_or_create_order_state(session_id)
     if order_state.order_saved:
-        debug_log("Order already saved for this session, skipping")
+        log.debug("Order already saved for this session, skipping")
         return False
     
     # Look for FINAL order confirmation patterns in bot response (more restrictive)
-    confirmation_patterns = [
-        r'thank you for.*order',
-        r'order.*will be delivered',
-        r'have a great day',
-        r'enjoy your meal',
-        r'order.*confirmed',
-        r'order.*placed.*successfully',
-        r'order.*complete',
-        r'receipt.*dining hall',  # More specific final confirmation
-    ]
-    
-    is_confirmation = any(re.search(pattern, bot_response.lower()) for pattern in confirmation_patterns)
+    is_confirmation = ORDER_CONFIRMATION_RE.search(bot_response.lower()) is not None
     
     if not is_confirmation:
-        debug_log("No FINAL order confirmation detected")
+        log.debug("No FINAL order confirmation detected")
         return False
     
-    debug_log("FINAL ORDER CONFIRMATION DETECTED!")
+    log.debug("FINAL ORDER CONFIRMATION DETECTED!")
     
     # Extract order details using unified function - get the LATEST order data
-    conversation = ConversationLogger.get_conversation(session_id)
+    conversation = await asyncio.to_thread(ConversationLogger.get_conversation, session_id)
     order_data = await extract_complete_order_data(conversation, session_id, for_confirmation=True)
     
     if not order_data:
-        debug_log("No order data extracted")
+        log.debug("No order data extracted")
         return False
     
     # Only save if we have ALL essential information (complete order)
     if (order_data['items'] and order_data['rf_id_valid'] and 
         order_data['building_valid'] and order_data['valid_phone']):
-        debug_log(f"SAVING FINAL ORDER: Items: {len(order_data['items'])}, RFID: {order_data['rf_id']}, Building: {order_data['building']}, Total: {order_data['total_cost']}")
+        log.debug("SAVING FINAL ORDER: Items: %d, RFID: %s, Building: %s, Total: %s", len(order_data['items']), order_data['rf_id'], order_data['building'], order_data['total_cost'])
         save_final_order_to_file(order_data)
         
         # Mark as saved and clean up session
@@ -1119,7 +1435,7 @@ async def detect_order_confirmation_and_save(session_id: str, bot_response: str,
         
         return True
     else:
-        debug_log(f"CANNOT SAVE - Missing essential info - Items: {len(order_data.get('items', []))}, RFID: {order_data['rf_id_valid']}, Building: {order_data['building_valid']}, Phone: {order_data.get('valid_phone', False)}")
+        log.debug("CANNOT SAVE - Missing essential info - Items: %d, RFID: %s, Building: %s, Phone: %s", len(order_data.get('items', [])), order_data['rf_id_valid'], order_data['building_valid'], order_data.get('valid_phone', False))
         return False
 
 def check_for_direct_order_response(session_id: str, user_message: str) -> Optional[str]:
@@ -1141,16 +1457,16 @@ def check_for_direct_order_response(session_id: str, user_message: str) -> Optio
     
     user_message_lower = user_message.lower().strip()
     
-    print(f"DEBUG: Checking direct response - Stage: {stage}, Message: '{user_message}'")
+    log.debug("Checking direct response - Stage: %s, Message: '%s'", stage, user_message)
     
     # Only handle order confirmation and cancellation
     if stage == "confirming_order":
-        if re.search(r'\b(yes|yeah|yep|confirm|ok|okay|sure|correct|right|proceed)\b', user_message_lower):
+        if CONFIRM_REPLY_RE.search(user_message_lower):
             # Start the order flow
             order_state = get_or_create_order_state(session_id)
             order_state.start_order(items, total_cost)
             return None  # Let the LLM handle the response with function calling
-        elif re.search(r'\b(no|nah|nope|cancel|wrong|incorrect)\b', user_message_lower):
+        elif DECLINE_REPLY_RE.search(user_message_lower):
             OrderKeywordDetector.save_detected_order(session_id, None)
             # Reset order state
             order_state = get_or_create_order_state(session_id)
@@ -1168,7 +1484,7 @@ def check_for_order_completion(session_id: str) -> Optional[str]:
     
     # Check if all required information is valid
     if (order_state.rf_id and 
-        order_state.building and order_state.building in AVAILABLE_BUILDINGS and
+        order_state.building and order_state.building in AVAILABLE_BUILDINGS_SET and
         order_state.phone):
         
         # Format order data for saving
@@ -1195,83 +1511,209 @@ def check_for_order_completion(session_id: str) -> Optional[str]:
     
     return None
 
+# Successful MCP responses as {(url, lowercased name): (expiry, data)}. The MCP server matches
+# names case-insensitively; the full menu has a shorter TTL than single items and categories
+MCP_ITEM_TTL = 60
+MCP_MENU_TTL = 30
+MCP_CACHE_SIZE = 512
+_mcp_cache: Dict[tuple, tuple] = {}
+# One lock per entry being fetched, so concurrent requests for it share one MCP call
+_mcp_locks: Dict[tuple, asyncio.Lock] = {}
+
+async def get_mcp_cached(url: str, params: Optional[Dict[str, str]], ttl: float):
+    """GET an MCP endpoint through the TTL cache; returns None for a non-200 response"""
+    key = (url, next(iter(params.values())).lower() if params else None)
+    entry = _mcp_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    lock = _mcp_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        # Another request may have fetched it while this one waited
+        entry = _mcp_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        try:
+            client = get_mcp_client()
+            resp = await client.get(url, params=params, timeout=2)
+            if resp.status_code != 200:
+                return None
+            data = _loads_json(resp.content)
+        finally:
+            _mcp_locks.pop(key, None)
+        if len(_mcp_cache) >= MCP_CACHE_SIZE:
+            _mcp_cache.pop(next(iter(_mcp_cache)))
+        _mcp_cache[key] = (time.monotonic() + ttl, data)
+        return data
+
 async def fetch_menu_item_from_mcp(item_name: str):
     """Query the MCP server for a menu item by name."""
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(MCP_ITEM_URL, params={"name": item_name}, timeout=2)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                return None
+        item = await get_mcp_cached(MCP_ITEM_URL, {"name": item_name}, MCP_ITEM_TTL)
+        # Callers may modify the item they get back
+        return dict(item) if isinstance(item, dict) else item
+    except Exception as e:
+        log.error("Error fetching menu item from MCP: %s", e)
+        return None
+
+# Menu items by lowercased name (first occurrence wins, as in the MCP server's item lookup),
+# with the menu.json data they were built from
+_menu_index = (None, {})
+
+def get_menu_index() -> Dict[str, Dict]:
+    """Get the local menu item index, rebuilt only when menu.json changes"""
+    global _menu_index
+    menu = load_json_cached(MENU_PATH)
+    source, index = _menu_index
+    if source is not menu:
+        index = {}
+        for item in flatten_menu(menu):
+            index.setdefault(item['name'].lower(), item)
+        _menu_index = (menu, index)
+    return index
+
+def lookup_item_local(item_name: str) -> Optional[Dict]:
+    """Find a menu item by name in the local copy of menu.json"""
+    try:
+        item = get_menu_index().get(item_name.lower())
     except Exception as e:
-        print(f"Error fetching menu item from MCP: {e}")
+        log.error("Error loading menu.json: %s", e)
         return None
+    return dict(item) if item else None
+
+async def lookup_menu_item(item_name: str):
+    """Find a menu item locally, asking the MCP server only when it is not in menu.json"""
+    return lookup_item_local(item_name) or await fetch_menu_item_from_mcp(item_name)
 
 async def fetch_full_menu_from_mcp():
     """Query the MCP server for the full menu."""
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(MCP_MENU_URL, timeout=2)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                return None
+        return await get_mcp_cached(MCP_MENU_URL, None, MCP_MENU_TTL)
     except Exception as e:
-        print(f"Error fetching full menu from MCP: {e}")
+        log.error("Error fetching full menu from MCP: %s", e)
         return None
 
 async def fetch_menu_category_from_mcp(category_name: str):
     """Query the MCP server for all items in a category by name."""
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(MCP_CATEGORY_URL, params={"category": category_name}, timeout=2)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                return None
+        return await get_mcp_cached(MCP_CATEGORY_URL, {"category": category_name}, MCP_ITEM_TTL)
     except Exception as e:
-        print(f"Error fetching menu category from MCP: {e}")
+        log.error("Error fetching menu category from MCP: %s", e)
         return None
 
+# Restaurant hours as (open second-of-day, close second-of-day, display text), with the
+# restaurants.json data they were built from
+_restaurant_hours = (None, [])
+
+def _second_of_day(hhmm: str) -> int:
+    hours, minutes = hhmm.split(':')
+    if not (0 <= int(hours) < 24 and 0 <= int(minutes) < 60):
+        raise ValueError(f"invalid time {hhmm!r}")
+    return int(hours) * 3600 + int(minutes) * 60
+
+def get_restaurant_hours():
+    """Get the parsed restaurant hours, rebuilt only when restaurants.json changes"""
+    global _restaurant_hours
+    data = load_json_cached(RESTAURANTS_PATH)
+    source, hours = _restaurant_hours
+    if source is not data:
+        hours = [
+            (_second_of_day(r['open']), _second_of_day(r['close']), f"{r['name']} (Open: {r['open']} - {r['close']})")
+            for r in data
+        ]
+        _restaurant_hours = (data, hours)
+    return hours
+
 def get_open_restaurants():
     now = datetime.datetime.now().time()
+    now_second = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
     try:
-        with open(RESTAURANTS_PATH, 'r') as f:
-            data = json.load(f)
-        open_list = []
-        for r in data:
-            open_time = datetime.datetime.strptime(r['open'], '%H:%M').time()
-            close_time = datetime.datetime.strptime(r['close'], '%H:%M').time()
-            if open_time <= now <= close_time:
-                open_list.append(f"{r['name']} (Open: {r['open']} - {r['close']})")
-        return open_list
+        return [text for open_second, close_second, text in get_restaurant_hours()
+                if open_second <= now_second <= close_second]
     except Exception as e:
-        print(f"Error loading restaurants.json: {e}")
+        log.error("Error loading restaurants.json: %s", e)
         return None
 
+# Acai bowl sizes (lowercase name -> price) plus one compiled pattern each for sizes
+# and flavors, derived from the menu object they were built from
+_acai_options = (None, ({}, None, None))
+
+def get_acai_options():
+    """Get the acai bowl sizes and flavors, rebuilt only when menu.json changes"""
+    global _acai_options
+    menu = load_json_cached(MENU_PATH)
+    source, options = _acai_options
+    if source is not menu:
+        acai = menu.get('Acai Bowls', {})
+        sizes = {k.lower(): v for k, v in acai.items() if k in ['Small', 'Large']}
+        flavors = [k.lower() for k in acai.keys() if k not in ['Small', 'Large']]
+        # Longest names first so a flavor wins over any shorter flavor it contains
+        size_re = re.compile(r'\b(?:' + '|'.join(map(re.escape, sizes)) + r')\b') if sizes else None
+        flavor_re = re.compile('|'.join(map(re.escape, sorted(flavors, key=len, reverse=True)))) if flavors else None
+        options = (sizes, size_re, flavor_re)
+        _acai_options = (menu, options)
+    return options
+
+# Acai bowl sizes and flavors prompt block, with the menu object it was built from
+_acai_context = (None, "")
+
+def get_acai_context() -> str:
+    """Get the acai bowl sizes/flavors prompt block, rebuilt only when menu.json changes"""
+    global _acai_context
+    menu = load_json_cached(MENU_PATH)
+    source, context = _acai_context
+    if source is not menu:
+        acai = menu.get('Acai Bowls', {})
+        # Extract sizes and prices
+        sizes = [(k, v) for k, v in acai.items() if k in ['Small', 'Large']]
+        # Extract flavors and descriptions
+        flavors = [(k, v) for k, v in acai.items() if k not in ['Small', 'Large']]
+        acai_parts = ["[ACAI BOWLS]\nSizes:\n"]
+        acai_parts.extend(f"- {size}: AED {price}\n" for size, price in sizes)
+        acai_parts.append("\nFlavors:\n")
+        acai_parts.extend(f"- {flavor}: {desc}\n" for flavor, desc in flavors)
+        acai_parts.append("\nPlease select a flavor and a size for your acai bowl order. "
+                          "For example: 'Small OG Bowl' or 'Large Choco Bowl'.")
+        context = ''.join(acai_parts)
+        _acai_context = (menu, context)
+    return context
+
+async def get_direct_intent_response(user_message: str) -> Optional[tuple]:
+    """
+    Answer a message that is only a menu or open-restaurants request straight from the data.
+    Returns (status line, response text), or None when the LLM should handle the message.
+    """
+    match = DIRECT_INTENT_RE.fullmatch(user_message)
+    if not match:
+        return None
+    if match.lastgroup == 'menu':
+        menu = await fetch_full_menu_from_mcp()
+        if not menu:
+            return None
+        return (FETCHING_MENU_STATUS,
+                "Here is today's menu:\n" + "\n".join(f"- {item['name']}: AED {item['price']}" for item in menu))
+    open_list = await asyncio.to_thread(get_open_restaurants)
+    if open_list is None:
+        return None
+    if not open_list:
+        return CHECKING_OPEN_STATUS, "No restaurants are currently open."
+    return (CHECKING_OPEN_STATUS,
+            "These restaurants are open right now:\n" + "\n".join(f"- {r}" for r in open_list))
+
 def parse_acai_bowl_order(text: str) -> Optional[Dict]:
     """
     Parse an acai bowl order from text like 'Small OG Bowl', return item dict with name, price, quantity, total_price.
     """
     try:
-        with open(MENU_PATH, 'r') as f:
-            menu = json.load(f)
-        acai = menu.get('Acai Bowls', {})
-        sizes = {k.lower(): v for k, v in acai.items() if k in ['Small', 'Large']}
-        flavors = [k.lower() for k in acai.keys() if k not in ['Small', 'Large']]
-        # Look for size and flavor in text
-        size_match = None
-        for size in sizes:
-            if re.search(rf'\b{size}\b', text.lower()):
-                size_match = size
-                break
-        flavor_match = None
-        for flavor in flavors:
-            if flavor in text.lower():
-                flavor_match = flavor
-                break
-        if size_match and flavor_match:
+        sizes, size_re, flavor_re = get_acai_options()
+        if size_re is None or flavor_re is None:
+            return None
+        # Look for size and flavor in text, one scan each
+        t = text.lower()
+        size_found = size_re.search(t)
+        flavor_found = flavor_re.search(t) if size_found else None
+        if size_found and flavor_found:
+            size_match = size_found.group()
+            flavor_match = flavor_found.group()
             price = sizes[size_match]
             name = f"{size_match.capitalize()} {flavor_match.title()} Bowl"
             return {
@@ -1281,9 +1723,20 @@ def parse_acai_bowl_order(text: str) -> Optional[Dict]:
                 'total_price': price * 1
             }
     except Exception as e:
-        print(f"Error parsing acai bowl order: {e}")
+        log.error("Error parsing acai bowl order: %s", e)
     return None
 
+def update_special_request(order_state, user_message: str):
+    """Record the user's answer to the special request question, if it is still open"""
+    if order_state.special_request is not None:
+        return
+    user_message_lower = user_message.lower().strip()
+    if user_message_lower in NO_SPECIAL_REQUEST_REPLIES:
+        order_state.special_request = 'None'
+    elif not ORDER_INFO_RE.search(user_message_lower):
+        # If message doesn't look like other order info, treat as special request
+        order_state.special_request = user_message.strip()
+
 @app.post('/chat')
 async def chat_endpoint(request: Request, background_tasks: BackgroundTasks):
     """
@@ -1295,7 +1748,7 @@ async def chat_endpoint(request: Request, background_tasks: BackgroundTasks):
         user_message = body["message"]
         history = body.get("history", [])
         session_id = body.get("session_id", "default")
-        print(f"DEBUG: Chat endpoint - session_id: {session_id}, message: '{user_message}'")
+        log.debug("Chat endpoint - session_id: %s, message: '%s'", session_id, user_message)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid request: {e}")
 
@@ -1304,79 +1757,99 @@ async def chat_endpoint(request: Request, background_tasks: BackgroundTasks):
     
     # Get order state
     order_state = get_or_create_order_state(session_id)
-    print(f"DEBUG ORDER STATE BEFORE: RFID={order_state.rf_id}, Building={order_state.building}, Phone={order_state.phone}, InFlow={order_state.in_order_flow}")
+    log.debug("ORDER STATE BEFORE: RFID=%s, Building=%s, Phone=%s, InFlow=%s",
+              order_state.rf_id, order_state.building, order_state.phone, order_state.in_order_flow)
     
     # PRE-VALIDATION - Check formats BEFORE LLM processing (runs for ALL order-related messages)
-    if order_state.in_order_flow or re.search(r'\b(rf|rfid|building|phone|05\d{8}|\d{4,15}|[A-Z]\d[A-Z]?)\b', user_message, re.IGNORECASE):
-        debug_log(f"PRE-VALIDATION TRIGGERED for message: '{user_message}'")
+    if order_state.in_order_flow or ORDER_DETAILS_RE.search(user_message):
+        log.debug("PRE-VALIDATION TRIGGERED for message: '%s'", user_message)
         validation_error = validate_and_update_order_state(user_message, order_state)
         if validation_error:
-            debug_log(f"VALIDATION ERROR: {validation_error}")
+            log.debug("VALIDATION ERROR: %s", validation_error)
             async def validation_error_stream():
-                yield validation_error
+                yield validation_error.encode('utf-8')
             
             # Log the error response
             ConversationLogger.log_message(session_id, validation_error, "bot")
-            return StreamingResponse(validation_error_stream(), media_type="text/plain")
+            return StreamingResponse(validation_error_stream(), media_type="text/plain; charset=utf-8")
         else:
-            debug_log("No validation errors found") 
+            log.debug("No validation errors found") 
     else:
-        debug_log("PRE-VALIDATION NOT TRIGGERED")
-    print(f"DEBUG ORDER STATE AFTER: RFID={order_state.rf_id}, Building={order_state.building}, Phone={order_state.phone}, InFlow={order_state.in_order_flow}")
+        log.debug("PRE-VALIDATION NOT TRIGGERED")
+    log.debug("ORDER STATE AFTER: RFID=%s, Building=%s, Phone=%s, InFlow=%s",
+              order_state.rf_id, order_state.building, order_state.phone, order_state.in_order_flow)
     
     # Process background order detection (keep existing code)
     await BackgroundOrderProcessor.process_session_orders(session_id)
     
     # Check for special request responses (keep existing code)
-    if order_state.in_order_flow and order_state.special_request is None:
-        user_message_lower = user_message.lower().strip()
-        if user_message_lower in ['no', 'none', 'n/a', 'no special requests', 'nothing', 'don\'t have any special requests', 'i don\'t have any special requests']:
-            order_state.special_request = 'None'
-        elif not re.search(r'\b(rf|id|building|phone|number)\b', user_message_lower):
-            # If message doesn't look like other order info, treat as special request
-            order_state.special_request = user_message.strip()
+    if order_state.in_order_flow:
+        update_special_request(order_state, user_message)
     
     # Check for explicit order cancellation
     direct_response = check_for_direct_order_response(session_id, user_message)
     if direct_response:
         async def direct_response_stream():
-            yield direct_response
+            yield direct_response.encode('utf-8')
         
         ConversationLogger.log_message(session_id, direct_response, "bot")
-        return StreamingResponse(direct_response_stream(), media_type="text/plain")
+        return StreamingResponse(direct_response_stream(), media_type="text/plain; charset=utf-8")
     
     # Extract current order state from conversation (for order changes) - IMPROVED LOGIC
-    conversation_order_data = await extract_complete_order_data(ConversationLogger.get_conversation(session_id), session_id)
+    conversation = await asyncio.to_thread(ConversationLogger.get_conversation, session_id)
+    conversation_order_data = await extract_complete_order_data(conversation, session_id)
     
     # Sync conversation changes with session state
     if conversation_order_data and order_state.in_order_flow:
         # Update session state with any order changes from conversation
         if items_are_different(conversation_order_data.get('items', []), order_state.items):
-            debug_log(f"Order items changed via conversation analysis")
-            debug_log(f"Old items: {order_state.items}")
-            debug_log(f"New items: {conversation_order_data['items']}")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Order items changed via conversation analysis")
+                log.debug("Old items: %s", order_state.items)
+                log.debug("New items: %s", conversation_order_data['items'])
             order_state.update_items(conversation_order_data['items'], conversation_order_data['total_cost'])
     
     # Check for order completion
     completion_message = check_for_order_completion(session_id)
     if completion_message:
         async def completion_response_stream():
-            yield completion_message
+            yield completion_message.encode('utf-8')
         
         ConversationLogger.log_message(session_id, completion_message, "bot")
-        return StreamingResponse(completion_response_stream(), media_type="text/plain")
+        return StreamingResponse(completion_response_stream(), media_type="text/plain; charset=utf-8")
+
+    # Refresh the data files off the event loop, so the sync readers below only hit the cache
+    await asyncio.gather(
+        load_file_cached_async(MENU_PATH),
+        load_file_cached_async(RESTAURANTS_PATH),
+        return_exceptions=True
+    )
+
+    # Plain menu / open-restaurant requests outside an order are answered without the LLM
+    if not order_state.in_order_flow:
+        direct_intent = await get_direct_intent_response(user_message)
+        if direct_intent:
+            status_line, direct_intent_response = direct_intent
+            async def direct_intent_stream():
+                yield status_line
+                yield direct_intent_response.encode('utf-8')
+            
+            ConversationLogger.log_message(session_id, direct_intent_response, "bot")
+            return StreamingResponse(direct_intent_stream(), media_type="text/plain; charset=utf-8")
 
     # Load the system prompt
     try:
-        with open(SYSTEM_PROMPT_PATH, 'r') as f:
-            system_prompt = f.read().strip()
+        system_prompt = await load_file_cached_async(SYSTEM_PROMPT_PATH, _read_text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load system prompt: {e}")
 
     async def ollama_stream():
+        intents = {match.lastgroup for match in INTENTS_RE.finditer(user_message)}
+        
         # Check if the user is asking for the full menu
-        if re.search(r"what'?s on the menu|show me the menu|today'?s menu|full menu", user_message, re.IGNORECASE):
-            yield "[Fetching menu data...]\n"
+        wants_menu = 'menu' in intents
+        if wants_menu:
+            yield FETCHING_MENU_STATUS
         
         # RAG-based multiple item extraction for immediate responses
         items_data = rag_extract_menu_items(user_message)
@@ -1396,24 +1869,47 @@ async def chat_endpoint(request: Request, background_tasks: BackgroundTasks):
         order_context = ""
         category_context = ""
 
+        # Announce every MCP lookup up front, then run them, the full menu fetch and the
+        # restaurant hours check (file stat/parse, in a worker thread) concurrently
+        lookup_items = []
+        lookups = []
+        for item_data in items_data:
+            if 'category' in item_data:
+                yield f"[Looking up category '{item_data['category']}' in the menu...]\n".encode('utf-8')
+                lookups.append(fetch_menu_category_from_mcp(item_data['category']))
+            elif 'name' in item_data:
+                yield f"[Looking up '{item_data['name']}' in the menu...]\n".encode('utf-8')
+                # Verify against menu.json, falling back to the MCP server
+                lookups.append(lookup_menu_item(item_data['name']))
+            else:
+                continue
+            lookup_items.append(item_data)
+        wants_open = 'open' in intents
+        if wants_menu:
+            lookups.append(fetch_full_menu_from_mcp())
+        if wants_open:
+            yield CHECKING_OPEN_STATUS
+            lookups.append(asyncio.to_thread(get_open_restaurants))
+        results = await asyncio.gather(*lookups, return_exceptions=True) if lookups else []
+        # A failed lookup counts as not found, like the fetch helpers' own error handling
+        results = [None if isinstance(result, BaseException) else result for result in results]
+        open_list = results.pop() if wants_open else None
+        menu = results.pop() if wants_menu else None
+
         if items_data:
             found_items = []
             not_found_items = []
             found_categories = []
-            for item_data in items_data:
+            for item_data, result in zip(lookup_items, results):
                 if 'category' in item_data:
                     category_name = item_data['category']
-                    yield f"[Looking up category '{category_name}' in the menu...]\n"
-                    category_items = await fetch_menu_category_from_mcp(category_name)
+                    category_items = result
                     if category_items:
                         found_categories.append({'category': category_name, 'items': category_items})
                     else:
                         not_found_items.append(category_name)
-                elif 'name' in item_data:
-                    item_name = item_data["name"]
-                    yield f"[Looking up '{item_name}' in the menu...]\n"
-                    # Verify with MCP server
-                    item = await fetch_menu_item_from_mcp(item_name)
+                else:
+                    item = result
                     if item:
                         # Update with verified data from MCP
                         verified_item = {
@@ -1430,37 +1926,23 @@ async def chat_endpoint(request: Request, background_tasks: BackgroundTasks):
                 items_summary = format_items_summary(found_items)
                 menu_items_context = f"Menu items found:\n{items_summary}"
                 # Check for order intent
-                if re.search(r'order|buy|get|want|purchase|can i get|i\'?ll have', user_message, re.IGNORECASE):
+                if 'order' in intents:
                     total_cost = sum(item['total_price'] for item in found_items)
                     order_context = f"\n[ORDER CONTEXT] User wants to order: {items_summary} (Total: AED {total_cost:.2f})."
-                    print(f"DEBUG: FOUND Order context: {order_context}")
+                    log.debug("FOUND Order context: %s", order_context)
             if found_categories:
+                category_parts = []
                 for cat in found_categories:
                     cat_name = cat['category']
                     cat_items = cat['items']
                     # Special-case for Acai Bowls
                     if cat_name.lower() == 'acai bowls':
-                        # Load the menu.json to get full structure
-                        with open(MENU_PATH, 'r') as f:
-                            menu_data = json.load(f)
-                        acai = menu_data.get('Acai Bowls', {})
-                        # Extract sizes and prices
-                        sizes = [(k, v) for k, v in acai.items() if k in ['Small', 'Large']]
-                        # Extract flavors and descriptions
-                        flavors = [(k, v) for k, v in acai.items() if k not in ['Small', 'Large']]
-                        acai_context = "[ACAI BOWLS]\nSizes:\n"
-                        for size, price in sizes:
-                            acai_context += f"- {size}: AED {price}\n"
-                        acai_context += "\nFlavors:\n"
-                        for flavor, desc in flavors:
-                            acai_context += f"- {flavor}: {desc}\n"
-                        acai_context += ("\nPlease select a flavor and a size for your acai bowl order. "
-                                         "For example: 'Small OG Bowl' or 'Large Choco Bowl'.")
-                        category_context += f"\n{acai_context}\n"
+                        category_parts.append(f"\n{get_acai_context()}\n")
                     else:
                         if cat_items:
                             cat_summary = "\n".join([f"- {i['name']}: AED {i['price']}" for i in cat_items])
-                            category_context += f"\n[MENU CATEGORY: {cat_name}]\n{cat_summary}\n"
+                            category_parts.append(f"\n[MENU CATEGORY: {cat_name}]\n{cat_summary}\n")
+                category_context = ''.join(category_parts)
             if not_found_items:
                 not_found_text = ", ".join(not_found_items)
                 if menu_items_context:
@@ -1470,20 +1952,15 @@ async def chat_endpoint(request: Request, background_tasks: BackgroundTasks):
 
         # Get menu context for full menu requests
         menu_context = ""
-        if re.search(r"what'?s on the menu|show me the menu|today'?s menu|full menu|what'?s available|what'?s available today", user_message, re.IGNORECASE):
-            menu = await fetch_full_menu_from_mcp()
+        if wants_menu:
             if menu:
-                menu_context = "[MENU DATA]:\n"
-                for item in menu:
-                    menu_context += f"- {item['name']}: AED {item['price']}\n"
+                menu_context = "[MENU DATA]:\n" + ''.join(f"- {item['name']}: AED {item['price']}\n" for item in menu)
             else:
                 menu_context = "[Menu data is currently unavailable.]"
 
         # Check if the user is asking about open restaurants
         open_restaurants_context = ""
-        if re.search(r"what'?s open|which restaurants are open|open now|open restaurants", user_message, re.IGNORECASE):
-            yield "[Checking which restaurants are open... Please wait.]\n"
-            open_list = get_open_restaurants()
+        if wants_open:
             if open_list is not None:
                 if open_list:
                     open_restaurants_context = "[OPEN RESTAURANTS]:\n" + "\n".join(f"- {r}" for r in open_list)
@@ -1493,66 +1970,57 @@ async def chat_endpoint(request: Request, background_tasks: BackgroundTasks):
                 open_restaurants_context = "[Restaurant data is currently unavailable.]"
 
         # Build the conversation history prompt
-        history_prompt = ""
-        for msg in history:
-            if msg.get("sender") == "user":
-                history_prompt += f"User: {msg['text']}\n"
-            elif msg.get("sender") == "bot":
-                history_prompt += f"Assistant: {msg['text']}\n"
-
-        # Prepare the payload for Ollama
-        prompt = system_prompt
-        
-        if menu_context:
-            prompt += f"\n\n{menu_context}"
-        if menu_items_context:
-            prompt += f"\n\n{menu_items_context}"
-        if category_context:
-            prompt += f"\n\n{category_context}"
-        if order_context:
-            prompt += f"\n\n{order_context}"
-        if open_restaurants_context:
-            prompt += f"\n\n{open_restaurants_context}"
-        prompt += f"\n{history_prompt}User: {user_message}\nAssistant:"
+        history_prompt = render_history_prompt(get_or_create_order_state(session_id), history)
 
         # Add order state context if in order flow - SINGLE SOURCE OF TRUTH
         order_state = get_or_create_order_state(session_id)
-        
+        order_status = ""
         if order_state.in_order_flow:
-            order_status = "\n[[CURRENT ORDER STATUS]]\n"
             items_inner = ', '.join([
                 f"{item.get('quantity', 1)}x {item['name']}"
                 for item in (order_state.items or [])
                 if isinstance(item, dict) and 'name' in item
             ])
-            order_status += f"Items: {items_inner}\n"
-            order_status += f"Total: AED {order_state.total_cost:.2f}\n"
-            
-            # Show provided information
-            order_status += "\nAlready Provided:\n"
+            status_parts = [
+                "\n[[CURRENT ORDER STATUS]]\n",
+                f"Items: {items_inner}\n",
+                f"Total: AED {order_state.total_cost:.2f}\n",
+                # Show provided information
+                "\nAlready Provided:\n",
+            ]
             if order_state.rf_id:
-                order_status += f"✓ RF ID: {order_state.rf_id}\n"
+                status_parts.append(f"✓ RF ID: {order_state.rf_id}\n")
             if order_state.building:
-                order_status += f"✓ Building: {order_state.building}\n"
+                status_parts.append(f"✓ Building: {order_state.building}\n")
             if order_state.phone:
-                order_status += f"✓ Phone: {order_state.phone}\n"
+                status_parts.append(f"✓ Phone: {order_state.phone}\n")
             if order_state.special_request is not None:
-                order_status += f"✓ Special Request: {order_state.special_request}\n"
+                status_parts.append(f"✓ Special Request: {order_state.special_request}\n")
             
             # Show still missing information
-            order_status += "\nStill Missing:\n"
+            status_parts.append("\nStill Missing:\n")
             if not order_state.rf_id:
-                order_status += "- RF ID (must be 6 digits)\n"
+                status_parts.append(MISSING_RF_ID_TEXT)
             if not order_state.building:
-                order_status += f"- Building (must be one of: {', '.join(AVAILABLE_BUILDINGS)})\n"
+                status_parts.append(MISSING_BUILDING_TEXT)
             if not order_state.phone:
-                order_status += "- Phone number (must be a valid UAE mobile number)\n"
+                status_parts.append(MISSING_PHONE_TEXT)
             if order_state.special_request is None:
-                order_status += "- Special Request (ask if they have any special requests, dietary restrictions, etc.)\n"
-            
-            # Insert the order status at the beginning of the prompt for priority
-            prompt = order_status + "\n" + prompt
-            
+                status_parts.append(MISSING_SPECIAL_REQUEST_TEXT)
+            order_status = ''.join(status_parts)
+
+        # Prepare the payload for Ollama. The static system prompt comes first and the history
+        # (oldest first) follows it, so each turn extends the prefix Ollama has cached; the
+        # per-request context goes after them, just before the new user turn
+        context_sections = (order_status, menu_context, menu_items_context, category_context,
+                            order_context, open_restaurants_context)
+        prompt = ''.join([
+            f"{system_prompt}\n{history_prompt}",
+            *(f"{section.strip()}\n\n" for section in context_sections if section),
+            f"User: {user_message}\nAssistant:",
+        ])
+
+        if order_state.in_order_flow:
             # Add validation tools to the payload
             payload = {
                 "model": OLLAMA_MODEL,
@@ -1572,94 +2040,147 @@ async def chat_endpoint(request: Request, background_tasks: BackgroundTasks):
                 "temperature": 0.1
             }
 
-        # Collect the bot response for logging
-        bot_response = ""
+        # Collect the bot response for logging, joined once the stream is done
+        bot_response_parts = []
         
-        async with httpx.AsyncClient(timeout=None) as client:
+        client = get_ollama_client()
+        batcher = TokenBatcher()
+        deadline = 0.0
+
+        def wait_limit() -> float:
+            # Wake up for the batch interval or the reply deadline, whichever comes first
+            time_left = max(deadline - time.monotonic(), 0)
+            due_in = batcher.due_in()
+            return time_left if due_in is None else min(due_in, time_left)
+
+        for attempt in range(OLLAMA_ATTEMPTS):
             try:
-                async with client.stream("POST", OLLAMA_URL, json=payload) as response:
-                    async for line in response.aiter_lines():
-                        if not line.strip():
-                            continue
+                deadline = time.monotonic() + OLLAMA_TOTAL_TIMEOUT
+                # Tool call results are answered in a single follow-up once the stream is done
+                validation_results = []
+                generation_context = None
+                # Tokens held back by the batcher are sent once it is due, even if the model stalls,
+                # and the reply is cut off at the deadline whether or not chunks keep arriving
+                async for data in aiter_with_idle(iter_ollama_stream(client, payload), wait_limit):
+                    if data is None:
+                        if time.monotonic() >= deadline:
+                            raise TimeoutError(f"no complete reply within {OLLAMA_TOTAL_TIMEOUT}s")
+                        if batcher.parts:
+                            yield batcher.flush()
+                        continue
+                    if data.get("done"):
+                        # Ollama's encoded state of the prompt and reply, to continue from
+                        generation_context = data.get("context")
+                    if "response" in data:
+                        chunk = data["response"]
+                        bot_response_parts.append(chunk)
+                        batch = batcher.add(chunk)
+                        if batch:
+                            yield batch
+                    elif "tool_calls" in data:
+                        # Handle tool calls
                         try:
-                            data = json.loads(line)
-                            if "response" in data:
-                                chunk = data["response"]
-                                bot_response += chunk
-                                yield chunk
-                            elif "tool_calls" in data:
-                                # Handle tool calls
-                                for tool_call in data["tool_calls"]:
-                                    function_name = tool_call["function"]["name"]
-                                    function_args = json.loads(tool_call["function"]["arguments"])
+                            for tool_call in data["tool_calls"]:
+                                function_name = tool_call["function"]["name"]
+                                function_args = tool_call["function"]["arguments"]
+                                if isinstance(function_args, str):
+                                    function_args = _loads_json(function_args)
                                     
-                                    if function_name in VALIDATION_FUNCTIONS:
-                                        result = VALIDATION_FUNCTIONS[function_name](**function_args)
-                                        
-                                        # Update order state based on validation results
-                                        if result["valid"]:
-                                            if function_name == "validate_rf_id":
-                                                order_state.rf_id = result["rf_id"]
-                                            elif function_name == "validate_phone_number":
-                                                order_state.phone = result["phone"]
-                                            elif function_name == "validate_building":
-                                                order_state.building = result["building"]
+                                if function_name in VALIDATION_FUNCTIONS:
+                                    result = VALIDATION_FUNCTIONS[function_name](**function_args)
                                         
-                                        # Add validation result to prompt context
-                                        prompt += f"\n[[VALIDATION RESULT]]\n{json.dumps(result)}\n"
+                                    # Update order state based on validation results
+                                    if result["valid"]:
+                                        if function_name == "validate_rf_id":
+                                            order_state.rf_id = result["rf_id"]
+                                        elif function_name == "validate_phone_number":
+                                            order_state.phone = result["phone"]
+                                        elif function_name == "validate_building":
+                                            order_state.building = result["building"]
                                         
-                                        # Get model's response to the validation
-                                        validation_response = await client.post(
-                                            OLLAMA_URL,
-                                            json={"model": OLLAMA_MODEL, "prompt": prompt, "stop": ["\nUser:", "\nAssistant:", "User:", "Assistant:", "\n\nUser:", "\n\nAssistant:"], "temperature": 0.25}
-                                        )
-                                        validation_data = validation_response.json()
-                                        if "response" in validation_data:
-                                            chunk = validation_data["response"]
-                                            bot_response += chunk
-                                            yield chunk
+                                    # Add validation result to prompt context
+                                    validation_results.append(f"\n[[VALIDATION RESULT]]\n{_dumps_json(result).decode('utf-8')}\n")
                         except Exception as e:
-                            print(f"Streaming parse error: {e}")
-            except httpx.RequestError as e:
-                print(f"Ollama connection error: {e}")
-                yield "[Sorry, there was an error connecting to the AI server. Please try again later or contact support.]"
+                            log.warning("Tool call error: %s", e)
+                
+                if validation_results:
+                    if batcher.parts:
+                        yield batcher.flush()
+                    validation_payload = {"model": OLLAMA_MODEL, "stream": True, "stop": ["\nUser:", "\nAssistant:", "User:", "Assistant:", "\n\nUser:", "\n\nAssistant:"], "temperature": 0.25}
+                    if generation_context:
+                        # Resume from the first generation, so only the results are new prompt tokens
+                        validation_payload["prompt"] = ''.join(validation_results)
+                        validation_payload["context"] = generation_context
+                    else:
+                        validation_payload["prompt"] = prompt + ''.join(validation_results)
+                    
+                    # Stream the model's response to the validations
+                    try:
+                        async for validation_data in aiter_with_idle(iter_ollama_stream(client, validation_payload), wait_limit):
+                            if validation_data is None:
+                                if time.monotonic() >= deadline:
+                                    raise TimeoutError(f"no complete reply within {OLLAMA_TOTAL_TIMEOUT}s")
+                                if batcher.parts:
+                                    yield batcher.flush()
+                            elif "response" in validation_data:
+                                chunk = validation_data["response"]
+                                bot_response_parts.append(chunk)
+                                batch = batcher.add(chunk)
+                                if batch:
+                                    yield batch
+                    except Exception as e:
+                        log.warning("Validation follow-up error: %s", e)
+                if batcher.parts:
+                    yield batcher.flush()
+            except (httpx.RequestError, TimeoutError) as e:
+                # Nothing has reached the client yet, so the request can be sent again
+                if not bot_response_parts and attempt + 1 < OLLAMA_ATTEMPTS:
+                    log.warning("Ollama request failed, retrying: %s", e)
+                    continue
+                log.error("Ollama connection error: %s", e)
+                if batcher.parts:
+                    yield batcher.flush()
+                yield b"[Sorry, there was an error connecting to the AI server. Please try again later or contact support.]"
             except Exception as e:
-                print(f"Ollama streaming error: {e}")
+                log.error("Ollama streaming error: %s", e)
+                if batcher.parts:
+                    yield batcher.flush()
                 error_msg = "[Sorry, an unexpected error occurred while processing your request. Please try again later.]"
-                bot_response = error_msg
-                yield error_msg
+                bot_response_parts[:] = [error_msg]
+                yield error_msg.encode('utf-8')
+            break
         
         # Log the bot response after streaming is complete
+        bot_response = ''.join(bot_response_parts)
         if bot_response:
-            debug_log(f"Bot response complete: '{bot_response[:100]}...'")
+            log.debug("Bot response complete: '%s...'", bot_response[:100])
             ConversationLogger.log_message(session_id, bot_response, "bot")
             
             # Check if order was already saved to prevent duplicates
             order_state = get_or_create_order_state(session_id)
             if not order_state.order_saved:
                 # Try regex-based detection first (for backwards compatibility)
-                debug_log("Calling detect_order_confirmation_and_save...")
+                log.debug("Calling detect_order_confirmation_and_save...")
                 saved = await detect_order_confirmation_and_save(session_id, bot_response, user_message)
-                debug_log(f"Regex order save result: {saved}")
+                log.debug("Regex order save result: %s", saved)
                 
                 # If regex didn't work, try LLM analysis
                 if not saved:
-                    debug_log("Regex detection failed, trying LLM analysis...")
+                    log.debug("Regex detection failed, trying LLM analysis...")
                     saved_llm = await detect_order_confirmation_and_save_with_llm(session_id, bot_response, user_message)
-                    debug_log(f"LLM order save result: {saved_llm}")
+                    log.debug("LLM order save result: %s", saved_llm)
                 else:
-                    debug_log("Order already saved via regex detection")
+                    log.debug("Order already saved via regex detection")
             else:
-                debug_log("Order already saved for this session, skipping all detection")
+                log.debug("Order already saved for this session, skipping all detection")
 
-    return StreamingResponse(ollama_stream(), media_type="text/plain")
+    return StreamingResponse(ollama_stream(), media_type="text/plain; charset=utf-8")
 
 @app.get('/warmup')
-def warmup():
+async def warmup():
     """
     Endpoint to warm up the Ollama model by sending a dummy request.
     """
-    import requests
     try:
         payload = {
             "model": OLLAMA_MODEL,
@@ -1669,7 +2190,8 @@ def warmup():
             "temperature": 0.25
         }
         # Send a dummy request to Ollama to trigger model load
-        r = requests.post(OLLAMA_URL, json=payload, timeout=10)
+        client = get_ollama_client()
+        r = await client.post(OLLAMA_URL, content=_dumps_json(payload), headers=JSON_HEADERS, timeout=10)
         if r.status_code == 200:
             return {"status": "warmed up"}
         else:
@@ -1681,10 +2203,11 @@ def warmup():
 @app.get('/debug/conversation/{session_id}')
 def debug_conversation(session_id: str):
     """Debug endpoint to view conversation history"""
-    conversation = ConversationLogger.get_conversation(session_id)
+    conversation = ConversationLogger.get_full_conversation(session_id)
     return {
         "session_id": session_id,
-        "conversation": conversation,
+        # Timestamps are stored as epoch seconds and shown as ISO strings
+        "conversation": [dict(message_data, timestamp=iso(message_data['timestamp'])) for message_data in conversation],
         "message_count": len(conversation)
     }
 
@@ -1692,6 +2215,9 @@ def debug_conversation(session_id: str):
 def debug_detected_order(session_id: str):
     """Debug endpoint to view detected order"""
     detected_order = OrderKeywordDetector.get_detected_order(session_id)
+    if detected_order and 'detected_at' in detected_order:
+        # Stored as epoch seconds; shown as the ISO string this endpoint always returned
+        detected_order = dict(detected_order, detected_at=iso(detected_order['detected_at']))
     
     return {
         "session_id": session_id,
@@ -1743,7 +2269,7 @@ async def test_order_changes(session_id: str):
         ConversationLogger.log_message(session_id, message, sender)
     
     # Extract final order data using unified function
-    conversation = ConversationLogger.get_conversation(session_id)
+    conversation = await asyncio.to_thread(ConversationLogger.get_conversation, session_id)
     order_data = await extract_complete_order_data(conversation, session_id)
     
     # Get the quantity of burgers in final order
@@ -1767,7 +2293,7 @@ async def test_order_changes(session_id: str):
 @app.post('/debug/analyze_conversation/{session_id}')
 async def debug_analyze_conversation(session_id: str):
     """Debug endpoint to test LLM conversation analysis"""
-    conversation = ConversationLogger.get_conversation(session_id)
+    conversation = await asyncio.to_thread(ConversationLogger.get_conversation, session_id)
     
     if not conversation:
         return {
@@ -1790,20 +2316,26 @@ async def debug_analyze_conversation(session_id: str):
     }
 
 @app.get('/debug/active_sessions')
-def debug_active_sessions():
+async def debug_active_sessions():
     """Debug endpoint to list active conversation sessions"""
     conversations_dir = os.path.join(os.path.dirname(__file__), 'conversations')
     temp_orders_dir = os.path.join(os.path.dirname(__file__), 'temp_orders')
     
-    active_sessions = []
+    # Session ids in first-seen order (dict keys dedupe a session with both log formats)
+    active_sessions = {}
     
     # Check conversation files
-    if os.path.exists(conversations_dir):
-        for file in os.listdir(conversations_dir):
-            if file.startswith('conversation_') and file.endswith('.json'):
-                session_id = file.replace('conversation_', '').replace('.json', '')
-                active_sessions.append(session_id)
-    
+    try:
+        files = await asyncio.to_thread(os.listdir, conversations_dir)
+    except FileNotFoundError:
+        files = []
+    for file in files:
+        # .jsonl logs, plus legacy .json logs not yet migrated
+        if file.startswith('conversation_') and file.endswith(('.jsonl', '.json')):
+            session_id = file[len('conversation_'):].rsplit('.', 1)[0]
+            active_sessions[session_id] = None
+    
+    active_sessions = list(active_sessions)
     return {
         "active_sessions": active_sessions,
         "count": len(active_sessions),
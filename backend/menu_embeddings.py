@@ -1,10 +1,14 @@
 import torch
 from sentence_transformers import SentenceTransformer, util
+import functools
 import json
+import logging
 import os
 import re
 from typing import List, Dict, Optional
 
+log = logging.getLogger(__name__)
+
 # Load and flatten menu
 
 def get_all_categories(menu):
@@ -50,8 +54,19 @@ all_names = item_names + category_names
 model = SentenceTransformer("all-MiniLM-L6-v2")
 menu_embeddings = model.encode(all_names, convert_to_tensor=True)
 
+# Exact lookups by name. Text that already is a menu name (as lowercased by
+# extract_quantities_and_items) resolves to it directly, since it would embed
+# to a cosine score of 1.0 against that name anyway
+_category_set = frozenset(category_names)
+_items_by_name = {}
+for _item in flat_items:
+    _items_by_name.setdefault(_item['name'], _item)
+_name_index = {}
+for _idx, _name in enumerate(all_names):
+    _name_index.setdefault(" ".join(_name.lower().split()), _idx)
+
 def is_category(name: str) -> bool:
-    return name in category_names
+    return name in _category_set
 
 def extract_quantities_and_items(user_message: str) -> List[Dict[str, str]]:
     """
@@ -80,7 +95,7 @@ def extract_quantities_and_items(user_message: str) -> List[Dict[str, str]]:
     items_with_qty = []
     processed_spans = []
     
-    print(f"DEBUG: Processing message: '{user_message}' -> '{processed_message}'")
+    log.debug("Processing message: '%s' -> '%s'", user_message, processed_message)
     
     for pattern in patterns:
         for match in re.finditer(pattern, processed_message, re.IGNORECASE):
@@ -98,7 +113,7 @@ def extract_quantities_and_items(user_message: str) -> List[Dict[str, str]]:
             else:
                 item_text, qty = groups[0].strip(), groups[1]
             
-            print(f"DEBUG: Found pattern match - qty: {qty}, item: {item_text}")
+            log.debug("Found pattern match - qty: %s, item: %s", qty, item_text)
             
             items_with_qty.append({
                 'text': item_text,
@@ -117,35 +132,53 @@ def extract_quantities_and_items(user_message: str) -> List[Dict[str, str]]:
                     'quantity': 1
                 })
     
-    print(f"DEBUG: Final extracted items: {items_with_qty}")
+    log.debug("Final extracted items: %s", items_with_qty)
     return items_with_qty
 
+# Distinct (text, threshold) pairs whose extracted items are remembered
+RAG_CACHE_SIZE = 4096
+
 def rag_extract_menu_items(user_message: str, threshold=0.5) -> List[Dict]:
     """
     Extract multiple menu items or categories from user message using RAG.
     Returns list of dicts: if a category, dict has {'category': name}; if item, dict has {'name': name, ...}
+    Results are memoized by text, so callers get fresh copies they are free to modify.
     """
+    return [dict(item) for item in _rag_extract_menu_items_cached(user_message, threshold)]
+
+@functools.lru_cache(maxsize=RAG_CACHE_SIZE)
+def _rag_extract_menu_items_cached(user_message: str, threshold) -> tuple:
+    return tuple(_rag_extract_menu_items(user_message, threshold))
+
+def _rag_extract_menu_items(user_message: str, threshold) -> List[Dict]:
     items_with_qty = extract_quantities_and_items(user_message)
+    
+    # Exact menu names skip the model; everything else is embedded in one batch
+    best_idxs = [_name_index.get(" ".join(item_data['text'].split())) for item_data in items_with_qty]
+    best_scores = [1.0 if idx is not None else 0.0 for idx in best_idxs]
+    pending = [i for i, idx in enumerate(best_idxs) if idx is None]
+    if pending:
+        user_embeddings = model.encode([items_with_qty[i]['text'] for i in pending], convert_to_tensor=True)
+        scores = util.cos_sim(user_embeddings, menu_embeddings)
+        for row, i in enumerate(pending):
+            best_idxs[i] = torch.argmax(scores[row]).item()
+            best_scores[i] = scores[row][best_idxs[i]].item()
+    
     found = []
-    for item_data in items_with_qty:
-        item_text = item_data['text']
+    for item_data, best_idx, best_score in zip(items_with_qty, best_idxs, best_scores):
         quantity = item_data['quantity']
-        user_embedding = model.encode(item_text, convert_to_tensor=True)
-        scores = util.cos_sim(user_embedding, menu_embeddings)[0]
-        best_idx = torch.argmax(scores).item()
-        best_score = scores[best_idx].item()
         best_name = all_names[best_idx]
         if best_score >= threshold:
             if is_category(best_name):
                 found.append({'category': best_name})
             else:
-                menu_item = next((item for item in flat_items if item['name'] == best_name), None)
+                menu_item = _items_by_name.get(best_name)
                 if menu_item:
                     menu_item = menu_item.copy()
                     menu_item['quantity'] = quantity
                     menu_item['total_price'] = menu_item['price'] * quantity
                     found.append(menu_item)
-    print(f"DEBUG: found menu items:{found}")
+    log.debug("found menu items: %s", found)
     return found
 
 def rag_extract_menu_item(user_message: str, threshold=0.6) -> Optional[Dict]:
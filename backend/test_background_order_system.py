@@ -0,0 +1,474 @@
+"""
+Tests for the conversation and order file caches and the background artifact writer
+"""
+
+import asyncio
+import contextlib
+import datetime
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+import background_order_system as bos
+from background_order_system import ARTIFACT_WRITER, ConversationLogger, OrderKeywordDetector
+
+
+@pytest.fixture(autouse=True)
+def session_files(tmp_path, monkeypatch):
+    """Point conversation and order files at a temporary directory and start with empty caches"""
+    archive_dir = tmp_path / "archive"
+    archive_dir.mkdir()
+    monkeypatch.setattr(bos, "ARCHIVE_DIR", str(archive_dir))
+    monkeypatch.setattr(bos, "_CONVERSATION_FILE_PREFIX", str(tmp_path / "conversation_"))
+    monkeypatch.setattr(bos, "_ORDER_FILE_PREFIX", str(tmp_path / "order_"))
+    for cache in (bos._CONV_CACHE, bos._ORDER_CACHE, bos._CONV_OFFSETS, bos._LAST_SCAN, bos._FILE_STAMPS):
+        monkeypatch.setattr(cache, "_entries", OrderedDict())
+    yield tmp_path
+    ARTIFACT_WRITER.flush()
+
+
+@contextlib.contextmanager
+def held_writes(timeout=5.0):
+    """Keep queued writes from landing until the block exits (or the timeout passes)"""
+    gate = threading.Event()
+    land = ARTIFACT_WRITER._land
+    ARTIFACT_WRITER._land = lambda batch: (gate.wait(timeout), land(batch))
+    try:
+        yield
+    finally:
+        gate.set()
+        ARTIFACT_WRITER.flush()
+        del ARTIFACT_WRITER._land
+
+
+def messages(conversation):
+    return [message_data["message"] for message_data in conversation]
+
+
+def write_lines(path, texts):
+    with open(path, "wb") as f:
+        f.write(b"".join(bos._dumps_line({"timestamp": 0, "sender": "user", "message": text}) for text in texts))
+
+
+# SessionCache and file stamps
+
+def test_session_cache_evicts_least_recently_used():
+    cache = bos.SessionCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_cache_is_stale_once_file_changes(session_files):
+    path = str(session_files / "data.json")
+    with open(path, "wb") as f:
+        f.write(b"1234")
+    bos._FILE_STAMPS.put(path, bos._file_stamp(path))
+    assert bos._is_cache_fresh(path)
+
+    # Same size, newer mtime
+    with open(path, "wb") as f:
+        f.write(b"5678")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert not bos._is_cache_fresh(path)
+
+
+# Conversation reads
+
+def test_tail_messages_reads_only_the_end(session_files):
+    path = str(session_files / "tail.jsonl")
+    write_lines(path, [f"m{i}" for i in range(50)])
+    assert messages(bos.tail_messages(path, 10, block_size=64)) == [f"m{i}" for i in range(40, 50)]
+    assert messages(bos.tail_messages(path, 100, block_size=64)) == [f"m{i}" for i in range(50)]
+    assert bos.count_lines(path) == 50
+
+
+def test_get_recent_messages_without_cache(session_files):
+    write_lines(ConversationLogger.get_conversation_file("s"), [f"m{i}" for i in range(30)])
+    recent, total = ConversationLogger.get_recent_messages("s", 5)
+    assert messages(recent) == ["m25", "m26", "m27", "m28", "m29"]
+    assert total == 30
+
+
+def test_conversation_picks_up_lines_written_elsewhere(session_files):
+    ConversationLogger.log_message("s", "one")
+    ConversationLogger.log_message("s", "two", "bot")
+    ARTIFACT_WRITER.flush()
+    assert messages(ConversationLogger.get_conversation("s")) == ["one", "two"]
+
+    # Another worker appends to the same file
+    with open(ConversationLogger.get_conversation_file("s"), "ab") as f:
+        f.write(bos._dumps_line({"timestamp": 0, "sender": "user", "message": "three"}))
+    assert messages(ConversationLogger.get_conversation("s")) == ["one", "two", "three"]
+
+    # ... or replaces it with something shorter
+    write_lines(ConversationLogger.get_conversation_file("s"), ["new"])
+    assert messages(ConversationLogger.get_conversation("s")) == ["new"]
+
+
+def test_log_message_leaves_returned_conversation_alone():
+    ConversationLogger.log_message("s", "one")
+    conversation = ConversationLogger.get_conversation("s")
+    ConversationLogger.log_message("s", "two")
+    assert messages(conversation) == ["one"]
+    assert messages(ConversationLogger.get_conversation("s")) == ["one", "two"]
+
+
+def test_unreadable_conversation_is_not_cached(session_files):
+    conversation_file = ConversationLogger.get_conversation_file("s")
+    with open(conversation_file, "wb") as f:
+        f.write(b"{not json\n")
+    assert ConversationLogger.get_conversation("s") == []
+
+    write_lines(conversation_file, ["recovered"])
+    assert messages(ConversationLogger.get_conversation("s")) == ["recovered"]
+
+
+def test_legacy_conversation_is_migrated(session_files):
+    legacy_file = ConversationLogger.get_legacy_conversation_file("s")
+    with open(legacy_file, "wb") as f:
+        f.write(bos._dumps([{"timestamp": "2025-01-01T10:00:00", "sender": "user", "message": "old"}]))
+
+    ConversationLogger.log_message("s", "new")
+    ARTIFACT_WRITER.flush()
+
+    assert not os.path.exists(legacy_file)
+    bos._CONV_CACHE.pop("s")
+    assert messages(ConversationLogger.get_conversation("s")) == ["old", "new"]
+
+
+# Rotation and archives
+
+def test_long_conversation_moves_older_half_to_archive(session_files, monkeypatch):
+    monkeypatch.setattr(bos, "MAX_LIVE_MESSAGES", 10)
+    for i in range(11):
+        ConversationLogger.log_message("s", f"m{i}")
+    ARTIFACT_WRITER.flush()
+
+    archive_files = ConversationLogger.get_archive_files("s")
+    assert [os.path.basename(path) for path in archive_files] == [
+        f"conversation_s_{datetime.datetime.now():%Y-%m}.jsonl"
+    ]
+    assert bos.count_lines(archive_files[0]) == 5
+
+    bos._CONV_CACHE.pop("s")
+    assert messages(ConversationLogger.get_conversation("s")) == [f"m{i}" for i in range(5, 11)]
+    assert messages(ConversationLogger.get_full_conversation("s")) == [f"m{i}" for i in range(11)]
+
+
+def test_archive_files_ignore_other_sessions(session_files):
+    for name in ("conversation_s_2025-01.jsonl", "conversation_s_2025-02.jsonl",
+                 "conversation_s_extra_2025-01.jsonl", "conversation_s_notes.txt"):
+        (session_files / "archive" / name).write_bytes(b"")
+    assert [os.path.basename(path) for path in ConversationLogger.get_archive_files("s")] == [
+        "conversation_s_2025-01.jsonl", "conversation_s_2025-02.jsonl"
+    ]
+
+
+# AsyncArtifactWriter
+
+def test_writer_coalesces_contiguous_writes():
+    batch = [
+        ("a", b"1", "ab"), ("a", b"2", "ab"),
+        ("b", b"old", "wb"), ("b", b"new", "wb"),
+        ("a", b"3", "ab"),
+        ("b", None, "rm"),
+    ]
+    assert bos.AsyncArtifactWriter._coalesce(batch) == [
+        ("a", [b"1", b"2"], "ab"),
+        ("b", [b"new"], "wb"),
+        ("a", [b"3"], "ab"),
+        ("b", [None], "rm"),
+    ]
+
+
+def test_writer_lands_writes_in_order(session_files):
+    path = str(session_files / "out.txt")
+    ARTIFACT_WRITER.append(path, b"a")
+    ARTIFACT_WRITER.append(path, b"b")
+    ARTIFACT_WRITER.write(path, b"c")
+    ARTIFACT_WRITER.append(path, b"d")
+    ARTIFACT_WRITER.flush()
+    with open(path, "rb") as f:
+        assert f.read() == b"cd"
+    assert not ARTIFACT_WRITER.is_pending(path)
+    assert bos._is_cache_fresh(path)
+
+
+def test_writer_overwrites_in_place(session_files):
+    path = str(session_files / "orders.txt")
+    with open(path, "wb") as f:
+        f.write(b"first order, longer")
+    inode = os.stat(path).st_ino
+
+    with held_writes():
+        ARTIFACT_WRITER.overwrite(path, b"second")
+        ARTIFACT_WRITER.overwrite(path, b"third")
+        assert ARTIFACT_WRITER.read(path) == b"third"
+
+    with open(path, "rb") as f:
+        assert f.read() == b"third"
+    assert os.stat(path).st_ino == inode
+    assert sorted(os.listdir(session_files)) == ["archive", "orders.txt"]
+
+
+def test_writer_reads_queued_writes(session_files):
+    path = str(session_files / "out.txt")
+    with open(path, "wb") as f:
+        f.write(b"on disk,")
+
+    with held_writes():
+        ARTIFACT_WRITER.append(path, b"queued")
+        assert ARTIFACT_WRITER.is_pending(path)
+        assert ARTIFACT_WRITER.read(path) == b"on disk,queued"
+
+        ARTIFACT_WRITER.remove(path)
+        with pytest.raises(FileNotFoundError):
+            ARTIFACT_WRITER.read(path)
+
+        ARTIFACT_WRITER.append(path, b"again")
+        assert ARTIFACT_WRITER.read(path) == b"again"
+
+    with open(path, "rb") as f:
+        assert f.read() == b"again"
+
+
+def test_reads_do_not_wait_for_queued_writes(session_files, monkeypatch):
+    monkeypatch.setattr(bos, "MAX_LIVE_MESSAGES", 4)
+    with held_writes():
+        for i in range(5):
+            ConversationLogger.log_message("s", f"m{i}")
+        bos._CONV_CACHE.pop("s")
+
+        start = time.monotonic()
+        assert messages(ConversationLogger.get_conversation("s")) == ["m2", "m3", "m4"]
+        assert messages(ConversationLogger.get_full_conversation("s")) == [f"m{i}" for i in range(5)]
+        recent, total = ConversationLogger.get_recent_messages("s", 2)
+        assert (messages(recent), total) == (["m3", "m4"], 3)
+        assert time.monotonic() - start < 1.0
+
+
+def test_cleanup_removes_files_after_queued_writes(session_files):
+    with held_writes():
+        ConversationLogger.log_message("s", "one")
+        OrderKeywordDetector.save_detected_order("s", {"items": [], "stage": "order_intent"})
+        ConversationLogger.cleanup_session("s")
+        assert ConversationLogger.get_conversation("s") == []
+        assert OrderKeywordDetector.get_detected_order("s") is None
+
+    assert not os.path.exists(ConversationLogger.get_conversation_file("s"))
+    assert not os.path.exists(ConversationLogger.get_order_file("s"))
+
+
+# Detected orders
+
+def test_detected_order_round_trip(session_files):
+    order = {"items": [{"name": "Margherita", "quantity": 2}], "stage": "order_intent", "detected_at": 1.0}
+    OrderKeywordDetector.save_detected_order("s", order)
+    ARTIFACT_WRITER.flush()
+    bos._ORDER_CACHE.pop("s")
+    assert OrderKeywordDetector.get_detected_order("s") == order
+
+
+def test_redetected_order_is_not_rewritten(session_files):
+    order = {"items": [{"name": "Margherita", "quantity": 2}], "stage": "order_intent",
+             "detected_at": 1.0, "conversation_length": 4}
+    OrderKeywordDetector.save_detected_order("s", order)
+    ARTIFACT_WRITER.flush()
+    with held_writes():
+        OrderKeywordDetector.save_detected_order("s", dict(order, detected_at=2.0, conversation_length=6))
+        assert not ARTIFACT_WRITER.is_pending(ConversationLogger.get_order_file("s"))
+
+        OrderKeywordDetector.save_detected_order("s", dict(order, stage="confirming_order"))
+        assert ARTIFACT_WRITER.is_pending(ConversationLogger.get_order_file("s"))
+
+
+def test_declined_order_is_cleared(session_files):
+    """Declining an order saves None over the detected one (check_for_direct_order_response)"""
+    OrderKeywordDetector.save_detected_order("s", {"items": [], "stage": "confirming_order", "detected_at": 1.0})
+    OrderKeywordDetector.save_detected_order("s", None)
+    assert OrderKeywordDetector.get_detected_order("s") is None
+
+    ARTIFACT_WRITER.flush()
+    with open(ConversationLogger.get_order_file("s"), "rb") as f:
+        assert f.read() == b"null"
+    bos._ORDER_CACHE.pop("s")
+    assert OrderKeywordDetector.get_detected_order("s") is None
+
+    # A later detection replaces the cleared order
+    OrderKeywordDetector.save_detected_order("s", {"items": [], "stage": "order_intent", "detected_at": 2.0})
+    assert OrderKeywordDetector.get_detected_order("s")["stage"] == "order_intent"
+
+
+# Order intent
+
+@pytest.mark.parametrize("text", [
+    "i want a margherita", "can i order now?", "get me a cola", "i'd like to buy lunch",
+    "purchase two wraps", "checkout", "i'll have the acai bowl", "ill have a latte",
+    "can i have fries", "add a cola to my cart", "place my order",
+])
+def test_has_order_intent(text):
+    assert OrderKeywordDetector._has_order_intent(text)
+    assert OrderKeywordDetector.ORDER_KEYWORDS_RE.search(text)
+
+
+@pytest.mark.parametrize("text", [
+    "hello", "what's on the menu?", "do you have pizza?", "wanted to ask something",
+    "getting hungry", "the orders are late", "cartoon", "place the usual", "buyer",
+])
+def test_no_order_intent(text):
+    assert not OrderKeywordDetector._has_order_intent(text)
+    assert not OrderKeywordDetector.ORDER_KEYWORDS_RE.search(text)
+
+
+# Item extraction
+
+@pytest.fixture
+def fake_menu(monkeypatch):
+    """Extract "<quantity> <name>" pairs and bare category names instead of running the embedding model"""
+    def extract(text):
+        found = []
+        for quantity, name in re.findall(r"(?:(\d+) )?(margherita|cola|pizza)", text.lower()):
+            if name == "pizza":
+                found.append({"category": "Pizza"})
+            else:
+                quantity = int(quantity or 1)
+                found.append({"name": name.title(), "price": 10.0, "quantity": quantity, "total_price": 10.0 * quantity})
+        return found
+
+    monkeypatch.setattr(bos, "_rag_extract", extract)
+
+
+def test_extract_items_merges_messages(fake_menu):
+    items = OrderKeywordDetector._extract_items(["any pizza?", "2 margherita", "and a cola", "make it 3 margherita"])
+    assert [(item.get("name") or item["category"], item.get("quantity")) for item in items] == [
+        ("Pizza", None), ("Cola", 1), ("Margherita", 3),
+    ]
+
+
+def test_extract_items_does_not_pair_across_messages(fake_menu):
+    items = OrderKeywordDetector._extract_items(["2", "margherita"])
+    assert [(item["name"], item["quantity"]) for item in items] == [("Margherita", 1)]
+
+
+# Order stage
+
+@pytest.mark.parametrize("text, stage", [
+    ("i want a margherita", "order_intent"),
+    ("my rfid is 123456", "rf_id_provided"),
+    ("card 12345 678", "order_intent"),
+    ("building A1B", "building_provided"),
+    ("a1b please", "building_provided"),
+    ("building a1d", "order_intent"),
+    ("call me on 050 123 4567", "phone_provided"),
+    ("call me on 050-123-4567", "phone_provided"),
+    ("12 34 56 78", "order_intent"),
+    # An unbroken run of 6+ digits reads as the RFID even when it is a phone number
+    ("0501234567", "rf_id_provided"),
+    # RFID first, then building, then phone
+    ("A1C, 050 123 4567, 123456", "rf_id_provided"),
+    ("050 123 4567 and A1C", "building_provided"),
+])
+def test_determine_order_stage(text, stage):
+    assert OrderKeywordDetector._determine_order_stage(text) == stage
+
+
+@pytest.mark.parametrize("text, stage", [
+    ("yes please", "confirming_order"),
+    ("Okay, CONFIRM it", "confirming_order"),
+    ("yesterday was good", "confirming_order"),
+    ("yesterday", "order_intent"),
+    # Confirmation ranks below every detail the user gave
+    ("yes A1A", "building_provided"),
+    ("sure, 050 123 4567", "phone_provided"),
+    ("yes 123456", "rf_id_provided"),
+])
+def test_confirmation_ranks_below_details(text, stage):
+    assert OrderKeywordDetector._determine_order_stage(text) == stage
+
+
+# Order updates
+
+def detected(stage, *names):
+    return {"items": [{"name": name, "quantity": 1} for name in names], "stage": stage}
+
+
+@pytest.mark.parametrize("old, new, updated", [
+    (detected("order_intent", "Margherita"), detected("confirming_order", "Margherita"), True),
+    (detected("building_provided", "Margherita"), detected("phone_provided", "Margherita"), True),
+    (detected("rf_id_provided", "Margherita"), detected("confirming_order", "Margherita"), False),
+    (detected("order_intent", "Margherita"), detected("order_intent", "Margherita"), False),
+    (detected("order_intent", "Margherita"), detected("order_intent", "Margherita", "Cola"), True),
+    (detected("phone_provided", "Margherita", "Cola"), detected("order_intent", "Margherita"), True),
+    # Only the number of items counts, not which ones
+    (detected("order_intent", "Margherita"), detected("order_intent", "Pepperoni"), False),
+    # Unknown or missing stages and items rank as the first stage and no items
+    (detected("unknown", "Margherita"), detected("order_intent", "Margherita"), False),
+    ({}, detected("confirming_order"), True),
+    ({"items": None, "stage": None}, detected("order_intent"), False),
+])
+def test_is_order_updated(old, new, updated):
+    assert bos.BackgroundOrderProcessor._is_order_updated(old, new) is updated
+
+
+# Timestamps
+
+@pytest.mark.parametrize("timestamp", [0.0, 1753264851.0, 1753264851.25, 1753264851.9999996, 1753264852.000001])
+def test_iso_matches_datetime(timestamp):
+    assert bos.iso(timestamp) == datetime.datetime.fromtimestamp(timestamp).isoformat()
+
+
+def test_iso_passes_through_stored_strings():
+    assert bos.iso("2025-01-01T10:00:00") == "2025-01-01T10:00:00"
+
+
+# Background processing
+
+def test_failed_scan_is_retried(session_files, monkeypatch):
+    ConversationLogger.log_message("s", "hi")
+    ConversationLogger.log_message("s", "i want a margherita")
+    calls = []
+
+    def scan(conversation, conversation_length=None):
+        calls.append(conversation_length)
+        if len(calls) == 1:
+            raise RuntimeError("embedding model not ready")
+        return None
+
+    monkeypatch.setattr(OrderKeywordDetector, "scan_for_order_intent", staticmethod(scan))
+    with pytest.raises(RuntimeError):
+        asyncio.run(bos.BackgroundOrderProcessor.process_session_orders("s"))
+    asyncio.run(bos.BackgroundOrderProcessor.process_session_orders("s"))
+    assert calls == [2, 2]
+
+    # Nothing new since the successful scan
+    asyncio.run(bos.BackgroundOrderProcessor.process_session_orders("s"))
+    assert calls == [2, 2]
+
+
+def test_session_runs_are_serialized_and_locks_dropped(monkeypatch):
+    active = []
+    overlapped = []
+
+    async def process(session_id):
+        active.append(session_id)
+        overlapped.append(active.count(session_id) > 1)
+        await asyncio.sleep(0.01)
+        active.remove(session_id)
+
+    async def run_all():
+        await asyncio.gather(*(bos.BackgroundOrderProcessor.process_session_orders(s) for s in "aab"))
+
+    monkeypatch.setattr(bos.BackgroundOrderProcessor, "_process_session_orders", staticmethod(process))
+    asyncio.run(run_all())
+    assert overlapped == [False, False, False]
+    assert bos._SESSION_LOCKS == {}
@@ -0,0 +1,306 @@
+"""
+Tests for the chat helpers in main
+"""
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("sentence_transformers")
+
+import main
+
+
+# Phone numbers
+
+@pytest.mark.parametrize("text, phone", [
+    ("050 123 4567", "0501234567"),
+    ("050-123-4567", "0501234567"),
+    ("(50) 123 4567", "0501234567"),
+    ("call +971 50 123 4567", "0501234567"),
+    ("971501234567", "0501234567"),
+    ("rfid 123456", None),
+    ("040 123 4567", None),
+    ("05012345678", None),
+])
+def test_normalize_phone(text, phone):
+    assert main.normalize_phone(text.translate(main.PHONE_SEPARATORS)) == phone
+
+
+def test_validate_phone_number():
+    assert main.validate_phone_number("055 765 4321") == {
+        "valid": True, "message": "Valid phone number", "phone": "0557654321"
+    }
+    assert not main.validate_phone_number("123")["valid"]
+    assert not main.validate_phone_number("")["valid"]
+
+
+# Ollama stream parsing
+
+class FakeStreamResponse:
+    """Stands in for an httpx response that delivers its body in the given chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def aiter_bytes(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def ndjson_lines(chunks):
+    async def collect():
+        return [line async for line in main.aiter_ndjson_lines(FakeStreamResponse(chunks))]
+    return asyncio.run(collect())
+
+
+def test_ndjson_lines_split_across_chunks():
+    chunks = [b'{"response": "Hel', b'lo"}\n{"resp', b'onse": "!"}\n', b'{"done": true}\n']
+    assert ndjson_lines(chunks) == [b'{"response": "Hello"}', b'{"response": "!"}', b'{"done": true}']
+
+
+def test_ndjson_lines_several_per_chunk_and_blank_lines():
+    chunks = [b'{"a": 1}\n\n{"b": 2}\n  \n', b'\n{"c": 3}\n']
+    assert ndjson_lines(chunks) == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+def test_ndjson_lines_trailing_line_without_newline():
+    assert ndjson_lines([b'{"a": 1}\n{"done":', b' true}']) == [b'{"a": 1}', b'{"done": true}']
+    assert ndjson_lines([b'{"a": 1}\n', b'  ']) == [b'{"a": 1}']
+    assert ndjson_lines([]) == []
+
+
+def test_ndjson_lines_keep_multibyte_characters_split_across_chunks():
+    line = '{"response": "caf\u00e9 \u0645\u0631\u062d\u0628\u0627"}'.encode()
+    assert ndjson_lines([line[:18], line[18:], b"\n"]) == [line]
+
+
+# Token batching
+
+def test_token_batcher_flushes_on_size(monkeypatch):
+    monkeypatch.setattr(main, "STREAM_BATCH_CHARS", 5)
+    monkeypatch.setattr(main, "STREAM_BATCH_INTERVAL", 60)
+    batcher = main.TokenBatcher()
+    assert batcher.add("ab") is None
+    assert batcher.add("cd") is None
+    assert batcher.add("\u00e9") == "abcd\u00e9".encode("utf-8")
+    assert batcher.due_in() is None
+    assert batcher.add("x") is None
+    assert batcher.flush() == b"x"
+
+
+def test_token_batcher_flushes_on_age(monkeypatch):
+    monkeypatch.setattr(main, "STREAM_BATCH_CHARS", 100)
+    monkeypatch.setattr(main, "STREAM_BATCH_INTERVAL", 0.05)
+    batcher = main.TokenBatcher()
+    assert batcher.add("a") is None
+    assert 0 < batcher.due_in() <= 0.05
+    time.sleep(0.06)
+    assert batcher.due_in() == 0
+    assert batcher.add("b") == b"ab"
+
+
+async def tokens(*timed_tokens):
+    for delay, token in timed_tokens:
+        await asyncio.sleep(delay)
+        yield token
+
+
+def test_aiter_with_idle_reports_stalls():
+    async def collect():
+        waits = iter([None, 0.05])
+        return [item async for item in main.aiter_with_idle(tokens((0, "a"), (0.2, "b"), (0, "c")), lambda: next(waits, None))]
+    assert asyncio.run(collect()) == ["a", None, "b", "c"]
+
+
+def test_aiter_with_idle_passes_errors_on():
+    async def failing():
+        yield "a"
+        raise main.httpx.RequestError("connection reset")
+
+    async def collect(items):
+        async for item in main.aiter_with_idle(failing(), lambda: None):
+            items.append(item)
+
+    items = []
+    with pytest.raises(main.httpx.RequestError):
+        asyncio.run(collect(items))
+    assert items == ["a"]
+
+
+# Chat history prompt
+
+def chat(n):
+    return [{"sender": "user" if i % 2 == 0 else "bot", "text": f"m{i}"} for i in range(n)]
+
+
+def test_history_prompt_renders_new_messages():
+    state = main.OrderState()
+    assert main.render_history_prompt(state, chat(2)) == "User: m0\nAssistant: m1\n"
+    history = chat(3) + [{"sender": "system", "text": "ignored"}]
+    assert main.render_history_prompt(state, history) == "User: m0\nAssistant: m1\nUser: m2\n"
+
+    # A history that is not a grown copy of the last one is rendered afresh
+    edited = [{"sender": "user", "text": "other"}] + chat(4)[1:]
+    assert main.render_history_prompt(state, edited) == "User: other\nAssistant: m1\nUser: m2\nAssistant: m3\n"
+
+
+def test_history_prompt_trims_whole_blocks(monkeypatch):
+    monkeypatch.setattr(main, "HISTORY_PROMPT_WINDOW", 10)
+    monkeypatch.setattr(main, "HISTORY_TRIM_BLOCK", 4)
+    state = main.OrderState()
+    firsts = []
+    for n in range(1, 31):
+        prompt = main.render_history_prompt(state, chat(n))
+        lines = prompt.splitlines()
+        assert lines[-1].endswith(f"m{n - 1}")
+        assert len(lines) <= 10
+        firsts.append(lines[0].split(": ")[1])
+        # Rendering the same history afresh keeps the same lines
+        assert main.render_history_prompt(main.OrderState(), chat(n)) == prompt
+
+    # The first line moves only when a whole block is dropped
+    assert firsts == ["m0"] * 10 + ["m4"] * 4 + ["m8"] * 4 + ["m12"] * 4 + ["m16"] * 4 + ["m20"] * 4
+
+
+# MCP cache
+
+class FakeMCPResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.content = main._dumps_json(data)
+
+
+@pytest.fixture
+def mcp_calls(monkeypatch):
+    """Answer MCP requests from a counting fake client, starting from an empty cache"""
+    calls = []
+
+    class FakeMCPClient:
+        async def get(self, url, params=None, timeout=None):
+            calls.append((url, params))
+            await asyncio.sleep(0.01)
+            if params and params.get("name") == "missing":
+                return FakeMCPResponse(404, {"detail": "not found"})
+            return FakeMCPResponse(200, {"name": params["name"] if params else "menu", "call": len(calls)})
+
+    monkeypatch.setattr(main, "get_mcp_client", lambda: FakeMCPClient())
+    monkeypatch.setattr(main, "_mcp_cache", {})
+    monkeypatch.setattr(main, "_mcp_locks", {})
+    return calls
+
+
+def test_mcp_cache_reuses_fresh_entries(mcp_calls):
+    async def fetch():
+        first = await main.get_mcp_cached(main.MCP_ITEM_URL, {"name": "Cola"}, 60)
+        again = await main.get_mcp_cached(main.MCP_ITEM_URL, {"name": "cola"}, 60)
+        menu = await main.get_mcp_cached(main.MCP_MENU_URL, None, 60)
+        return first, again, menu
+
+    first, again, menu = asyncio.run(fetch())
+    assert first == again == {"name": "Cola", "call": 1}
+    assert menu == {"name": "menu", "call": 2}
+    assert len(mcp_calls) == 2
+
+
+def test_mcp_cache_entries_expire(mcp_calls):
+    async def fetch():
+        first = await main.get_mcp_cached(main.MCP_ITEM_URL, {"name": "Cola"}, 0.05)
+        await asyncio.sleep(0.06)
+        return first, await main.get_mcp_cached(main.MCP_ITEM_URL, {"name": "Cola"}, 0.05)
+
+    assert asyncio.run(fetch()) == ({"name": "Cola", "call": 1}, {"name": "Cola", "call": 2})
+
+
+def test_mcp_cache_shares_one_fetch_between_concurrent_requests(mcp_calls):
+    async def fetch():
+        return await asyncio.gather(
+            *(main.get_mcp_cached(main.MCP_ITEM_URL, {"name": name}, 60) for name in ["Cola", "cola", "COLA", "Wrap"])
+        )
+
+    results = asyncio.run(fetch())
+    assert results[0] == results[1] == results[2]
+    assert sorted(params["name"] for _, params in mcp_calls) == ["Cola", "Wrap"]
+    assert main._mcp_locks == {}
+
+
+def test_mcp_cache_skips_failed_lookups(mcp_calls):
+    async def fetch():
+        return [await main.get_mcp_cached(main.MCP_ITEM_URL, {"name": "missing"}, 60) for _ in range(2)]
+
+    assert asyncio.run(fetch()) == [None, None]
+    assert len(mcp_calls) == 2
+    assert main._mcp_cache == {}
+
+
+def test_mcp_cache_evicts_oldest_entry(mcp_calls, monkeypatch):
+    monkeypatch.setattr(main, "MCP_CACHE_SIZE", 2)
+
+    async def fetch(names):
+        for name in names:
+            await main.get_mcp_cached(main.MCP_ITEM_URL, {"name": name}, 60)
+
+    asyncio.run(fetch(["a", "b", "c", "b", "a"]))
+    assert [params["name"] for _, params in mcp_calls] == ["a", "b", "c", "a"]
+
+
+# Direct menu and open-restaurant answers
+
+@pytest.mark.parametrize("text, intent", [
+    ("what's on the menu", "menu"),
+    ("Hi, show me the menu please!", "menu"),
+    ("hey can you show me the menu?", "menu"),
+    ("todays menu", "menu"),
+    ("what's open right now?", "open"),
+    ("Which restaurants are open today", "open"),
+    ("  open restaurants  ", "open"),
+])
+def test_direct_intent_matches_bare_requests(text, intent):
+    assert main.DIRECT_INTENT_RE.fullmatch(text).lastgroup == intent
+
+
+@pytest.mark.parametrize("text", [
+    "what's on the menu for vegans?",
+    "show me the menu and order a cola",
+    "i want 2 margherita",
+    "is the menu good",
+    "what's open on friday",
+])
+def test_direct_intent_leaves_other_messages_to_the_llm(text):
+    assert main.DIRECT_INTENT_RE.fullmatch(text) is None
+
+
+def test_direct_menu_response(monkeypatch):
+    async def fetch_full_menu():
+        return [{"name": "Margherita", "price": 31}, {"name": "Cola", "price": 5}]
+
+    monkeypatch.setattr(main, "fetch_full_menu_from_mcp", fetch_full_menu)
+    status, text = asyncio.run(main.get_direct_intent_response("show me the menu"))
+    assert status == main.FETCHING_MENU_STATUS
+    assert text == "Here is today's menu:\n- Margherita: AED 31\n- Cola: AED 5"
+
+
+def test_direct_open_response(monkeypatch):
+    monkeypatch.setattr(main, "get_open_restaurants", lambda: ["Pizza Place (Open: 10:00 - 22:00)"])
+    assert asyncio.run(main.get_direct_intent_response("what's open?")) == (
+        main.CHECKING_OPEN_STATUS, "These restaurants are open right now:\n- Pizza Place (Open: 10:00 - 22:00)"
+    )
+
+    monkeypatch.setattr(main, "get_open_restaurants", lambda: [])
+    assert asyncio.run(main.get_direct_intent_response("what's open?")) == (
+        main.CHECKING_OPEN_STATUS, "No restaurants are currently open."
+    )
+
+
+def test_direct_response_falls_back_to_the_llm_without_data(monkeypatch):
+    async def fetch_full_menu():
+        return None
+
+    monkeypatch.setattr(main, "fetch_full_menu_from_mcp", fetch_full_menu)
+    monkeypatch.setattr(main, "get_open_restaurants", lambda: None)
+    assert asyncio.run(main.get_direct_intent_response("show me the menu")) is None
+    assert asyncio.run(main.get_direct_intent_response("what's open?")) is None
+    assert asyncio.run(main.get_direct_intent_response("i want a cola")) is None
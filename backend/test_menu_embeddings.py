@@ -0,0 +1,46 @@
+"""
+Tests for the memoized menu item extraction
+"""
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import menu_embeddings
+
+
+@pytest.fixture
+def fake_extraction(monkeypatch):
+    """Replace the embedding lookup with a counting fake and start from an empty memo"""
+    calls = []
+
+    def extract(user_message, threshold):
+        calls.append(user_message)
+        return [{"name": "Margherita", "price": 31.0, "quantity": 2, "total_price": 62.0}, {"category": "Pizza"}]
+
+    monkeypatch.setattr(menu_embeddings, "_rag_extract_menu_items", extract)
+    menu_embeddings._rag_extract_menu_items_cached.cache_clear()
+    yield calls
+    menu_embeddings._rag_extract_menu_items_cached.cache_clear()
+
+
+def test_extraction_is_memoized_per_text(fake_extraction):
+    first = menu_embeddings.rag_extract_menu_items("2 margherita")
+    second = menu_embeddings.rag_extract_menu_items("2 margherita")
+    assert first == second
+    assert fake_extraction == ["2 margherita"]
+
+    menu_embeddings.rag_extract_menu_items("2 margherita", threshold=0.6)
+    menu_embeddings.rag_extract_menu_items("a pizza")
+    assert fake_extraction == ["2 margherita", "2 margherita", "a pizza"]
+
+
+def test_callers_get_copies_of_memoized_items(fake_extraction):
+    items = menu_embeddings.rag_extract_menu_items("2 margherita")
+    items[0]["quantity"] = 5
+    items.append({"name": "Extra"})
+
+    again = menu_embeddings.rag_extract_menu_items("2 margherita")
+    assert again[0]["quantity"] == 2
+    assert len(again) == 2
+    assert again[0] is not items[0]
@@ -3,8 +3,12 @@ import re
 import phonenumbers
 from typing import Dict, Union, List
 
-# Available buildings (keep this updated with your actual building list)
-AVAILABLE_BUILDINGS = ["A1A", "A1B", "A1C", "A2A", "A2B", "A2C", "A3", "A4", "A5A", "A5B", "A5C", "A6A", "A6B", "A6C"]
+# Available buildings (keep this updated with your actual building list).
+# The chat backend validates against its own list in main.py, which also accepts
+# A1, A2, A5, A6, F1, F2 and C1-C3; this module is not imported there
+AVAILABLE_BUILDINGS = ("A1A", "A1B", "A1C", "A2A", "A2B", "A2C", "A3", "A4", "A5A", "A5B", "A5C", "A6A", "A6B", "A6C")
+AVAILABLE_BUILDINGS_SET = frozenset(AVAILABLE_BUILDINGS)
+AVAILABLE_BUILDINGS_JOINED = ', '.join(AVAILABLE_BUILDINGS)
 
 def validate_rf_id(text: str) -> Dict[str, Union[str, bool]]:
     """Validate if the text contains a valid RFID Number (exactly 6 digits)"""
@@ -187,7 +191,7 @@ def validate_building(text: str) -> Dict[str, Union[str, bool]]:
     if not building_matches:
         return {
             "valid": False,
-            "message": f"Invalid building format. Must be one of: {', '.join(AVAILABLE_BUILDINGS)}",
+            "message": f"Invalid building format. Must be one of: {AVAILABLE_BUILDINGS_JOINED}",
             "building": None,
             "error_type": "invalid_format"
         }
@@ -196,12 +200,12 @@ def validate_building(text: str) -> Dict[str, Union[str, bool]]:
     building = building_matches[0].upper()
     
     print(f"DEBUG: Building validation - Found: '{building}', Available: {AVAILABLE_BUILDINGS}")
-    print(f"DEBUG: Is '{building}' in available list: {building in AVAILABLE_BUILDINGS}")
+    print(f"DEBUG: Is '{building}' in available list: {building in AVAILABLE_BUILDINGS_SET}")
     
-    if building not in AVAILABLE_BUILDINGS:
+    if building not in AVAILABLE_BUILDINGS_SET:
         return {
             "valid": False,
-            "message": f"Building '{building}' is not available. Valid buildings: {', '.join(AVAILABLE_BUILDINGS)}",
+            "message": f"Building '{building}' is not available. Valid buildings: {AVAILABLE_BUILDINGS_JOINED}",
             "building": building,
             "error_type": "invalid_value"
         }
@@ -385,7 +389,7 @@ VALIDATION_TOOLS = [
         "type": "function",
         "function": {
             "name": "validate_building",
-            "description": f"Validate if the text contains a valid building number (must be one of: {', '.join(AVAILABLE_BUILDINGS)})",
+            "description": f"Validate if the text contains a valid building number (must be one of: {AVAILABLE_BUILDINGS_JOINED})",
             "parameters": {
                 "type": "object",
                 "properties": {